@@ -0,0 +1,234 @@
+# bench.py
+# Times each stage of the embed/extract/save/preview pipeline on synthetic
+# covers and compares the results against a stored baseline
+import argparse
+import cProfile
+import json
+import os
+import statistics
+import sys
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+from cryptography.fernet import Fernet
+from PIL import Image
+
+import stego
+from metrics import peak_rss_mb
+from preview_cache import load_thumbnail
+
+DEFAULT_SIZES = "0.3,2,12,24,100"
+DEFAULT_MODES = "RGB,RGBA,L,P"
+DEFAULT_PAYLOADS = "100,10000,1000000"
+DEFAULT_THREADS = "1"
+
+
+def cover_dimensions(megapixels):
+    width = round((megapixels * 1e6 * 4 / 3) ** 0.5)
+    return width, max(1, round(megapixels * 1e6 / width))
+
+
+def synthetic_cover(megapixels, mode, seed=0):
+    # A gradient with noise: compresses like a photo rather than like pure
+    # noise (worst case) or a flat fill (best case)
+    width, height = cover_dimensions(megapixels)
+    rng = np.random.default_rng(seed)
+    gradient = (np.arange(width, dtype=np.uint16)[None, :] * 200 // max(1, width - 1)
+                + np.arange(height, dtype=np.uint16)[:, None] * 55 // max(1, height - 1))
+    channels = {"RGB": 3, "RGBA": 4}.get(mode, 1)
+    pixels = gradient[:, :, None] + rng.integers(0, 16, (height, width, channels), dtype=np.uint16)
+    pixels = np.minimum(pixels, 255).astype(np.uint8)
+
+    if mode == "P":
+        image = Image.fromarray(pixels[:, :, 0], "L").convert("P")
+        image.putpalette([v for i in range(256) for v in (i, 255 - i, i // 2)])
+        return image
+    return Image.fromarray(pixels[:, :, 0] if channels == 1 else pixels, mode)
+
+
+# One function per stage so profilers (cProfile, py-spy) show the stage names
+def stage_convert(image):
+    return image.convert("RGB")
+
+
+def stage_encrypt(cipher, payload):
+    return cipher.encrypt(payload)
+
+
+def stage_embed(image, token, threads=1):
+    stego.encode_lsb(image, token, threads=threads)
+
+
+def stage_save(image, path):
+    stego.save_atomic(image, path)
+
+
+def stage_open(path):
+    image = Image.open(path)
+    image.load()
+    return image
+
+
+def stage_extract(image, threads=1):
+    return stego.decode_lsb(image, threads=threads)
+
+
+def stage_decrypt(cipher, token):
+    return cipher.decrypt(token)
+
+
+def stage_preview(path):
+    return load_thumbnail(path)
+
+
+def run_case(megapixels, mode, payload_size, repeat, profile_dir, threads=1):
+    # Single-threaded cases keep their old names so existing baselines match
+    case = f"{megapixels}MP-{mode}-{payload_size}B" + (f"-{threads}T" if threads > 1 else "")
+    cover = synthetic_cover(megapixels, mode)
+    pixels = cover.width * cover.height
+    capacity = stego.Layout(cover.width, cover.height).max_payload()
+    cipher = Fernet(Fernet.generate_key())
+    payload = os.urandom(payload_size)
+
+    # Fernet output is about 4/3 of the input; skip payloads that can't fit
+    if len(cipher.encrypt(payload)) > capacity:
+        return {"case": case, "skipped": "payload exceeds cover capacity"}
+
+    timings = {}
+
+    def timed(stage, func, *args):
+        profiler = cProfile.Profile() if profile_dir else None
+        samples = []
+        for _ in range(repeat):
+            if profiler:
+                profiler.enable()
+            started = time.perf_counter()
+            result = func(*args)
+            samples.append(time.perf_counter() - started)
+            if profiler:
+                profiler.disable()
+        if profiler:
+            profiler.dump_stats(os.path.join(profile_dir, f"{case}-{stage}.prof"))
+        timings[stage] = statistics.median(samples)
+        return result
+
+    with tempfile.TemporaryDirectory() as workdir:
+        path = os.path.join(workdir, "cover.png")
+        image = timed("convert", stage_convert, cover) if mode in ("L", "P") else cover.copy()
+        token = timed("encrypt", stage_encrypt, cipher, payload)
+        timed("embed", stage_embed, image, token, threads)
+        timed("save", stage_save, image, path)
+        output_bytes = os.path.getsize(path)
+        saved = timed("open", stage_open, path)
+        extracted = timed("extract", stage_extract, saved, threads)
+        timed("decrypt", stage_decrypt, cipher, extracted)
+        timed("preview", stage_preview, path)
+
+    if extracted != token:
+        raise AssertionError(f"{case}: extracted payload does not match")
+
+    stages = {}
+    for stage, seconds in timings.items():
+        stages[stage] = {
+            "seconds": round(seconds, 6),
+            "mp_per_s": round(pixels / 1e6 / seconds, 3) if seconds else None,
+            "bytes_per_s": round(len(token) / seconds, 1) if seconds else None,
+        }
+    # None where the resource module is missing (Windows)
+    peak_rss = peak_rss_mb()
+    if peak_rss is not None:
+        peak_rss = round(peak_rss, 1)
+    return {"case": case, "megapixels": megapixels, "mode": mode, "pixels": pixels,
+            "threads": threads, "payload_bytes": payload_size, "embedded_bytes": len(token),
+            "output_bytes": output_bytes, "peak_rss_mb": peak_rss, "stages": stages}
+
+
+def compare(results, baseline, threshold):
+    # Returns (case, stage, baseline seconds, current seconds) for every stage
+    # that got slower by more than threshold
+    previous = {r["case"]: r for r in baseline.get("results", []) if "stages" in r}
+    regressions = []
+    for result in results:
+        old = previous.get(result["case"])
+        if not old or "stages" not in result:
+            continue
+        for stage, timing in result["stages"].items():
+            before = old["stages"].get(stage, {}).get("seconds")
+            if before and timing["seconds"] > before * (1 + threshold):
+                regressions.append((result["case"], stage, before, timing["seconds"]))
+    return regressions
+
+
+def parse_list(text, convert):
+    return [convert(item) for item in text.split(",") if item]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the steganography pipeline")
+    parser.add_argument("--sizes", default=DEFAULT_SIZES, help="Cover sizes in megapixels")
+    parser.add_argument("--modes", default=DEFAULT_MODES, help="Cover image modes")
+    parser.add_argument("--payloads", default=DEFAULT_PAYLOADS, help="Payload sizes in bytes")
+    parser.add_argument("--threads", default=DEFAULT_THREADS,
+                        help="Thread counts for the embed and extract stages, e.g. 1,4,16")
+    parser.add_argument("--repeat", type=int, default=3, help="Runs per stage (median is kept)")
+    parser.add_argument("--output", help="Write the JSON results here")
+    parser.add_argument("--baseline", help="Compare against a previous --output file")
+    parser.add_argument("--threshold", type=float, default=0.10,
+                        help="Slowdown fraction reported as a regression (default: 0.10)")
+    parser.add_argument("--profile", metavar="DIR",
+                        help="Dump a cProfile file per case and stage into DIR")
+    parser.add_argument("--in-process", action="store_true",
+                        help="Run every case in this process (peak RSS then accumulates; "
+                             "useful when attaching py-spy)")
+    args = parser.parse_args(argv)
+
+    if args.profile:
+        os.makedirs(args.profile, exist_ok=True)
+
+    cases = [(size, mode, payload, args.repeat, args.profile, threads)
+             for size in parse_list(args.sizes, float)
+             for mode in parse_list(args.modes, str)
+             for payload in parse_list(args.payloads, int)
+             for threads in parse_list(args.threads, int)]
+
+    results = []
+    if args.in_process:
+        for case in cases:
+            results.append(run_case(*case))
+            print(json.dumps(results[-1]), file=sys.stderr)
+    else:
+        # A fresh process per case keeps each peak RSS figure independent
+        with ProcessPoolExecutor(max_workers=1, max_tasks_per_child=1) as executor:
+            for result in executor.map(run_case, *zip(*cases)):
+                results.append(result)
+                print(json.dumps(result), file=sys.stderr)
+
+    report = {"created": time.time(), "python": sys.version.split()[0],
+              "numpy": np.__version__, "pillow": Image.__version__, "results": results}
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+
+    for result in results:
+        if "stages" not in result:
+            print(f"{result['case']:<28} skipped: {result['skipped']}")
+            continue
+        stages = "  ".join(f"{stage} {timing['seconds'] * 1000:.1f}ms"
+                           for stage, timing in result["stages"].items())
+        rss = f"  rss {result['peak_rss_mb']}MB" if result["peak_rss_mb"] is not None else ""
+        print(f"{result['case']:<28} {stages}{rss}")
+
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as f:
+            regressions = compare(results, json.load(f), args.threshold)
+        for case, stage, before, after in regressions:
+            print(f"REGRESSION {case} {stage}: {before * 1000:.1f}ms -> {after * 1000:.1f}ms",
+                  file=sys.stderr)
+        return 1 if regressions else 0
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,433 @@
+# cli.py
+import argparse
+import contextlib
+import glob
+import json
+import os
+import random
+import string
+import sys
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from cryptography.fernet import Fernet
+from PIL import Image
+
+import mailer
+import multiframe
+import payload
+import stego
+import streaming
+
+IMAGE_EXTENSIONS = (".png", ".jpg", ".jpeg", ".bmp", ".tif", ".tiff", ".webp", ".gif", ".apng")
+
+
+def expand_inputs(patterns):
+    # Yields (path, base) pairs; base is the root used to mirror directory
+    # trees under the output directory
+    seen = set()
+    for pattern in patterns:
+        if os.path.isdir(pattern):
+            matches = []
+            for dirpath, dirnames, filenames in os.walk(pattern):
+                dirnames.sort()
+                matches.extend(os.path.join(dirpath, name) for name in sorted(filenames)
+                               if name.lower().endswith(IMAGE_EXTENSIONS))
+            base = pattern
+        else:
+            matches = sorted(glob.glob(pattern, recursive=True))
+            if not matches:
+                print(f"warning: no files match {pattern}", file=sys.stderr)
+            base = None
+
+        for path in matches:
+            if not os.path.isfile(path) or os.path.abspath(path) in seen:
+                continue
+            seen.add(os.path.abspath(path))
+            yield path, base or os.path.dirname(path) or "."
+
+
+def output_path(path, base, out_dir, suffix, extension):
+    relative_dir = os.path.relpath(os.path.dirname(path) or ".", base)
+    name = os.path.splitext(os.path.basename(path))[0] + suffix + extension
+    return os.path.normpath(os.path.join(out_dir, relative_dir, name))
+
+
+def open_cover(path):
+    image = Image.open(path)
+    if image.mode not in ("RGB", "RGBA"):
+        has_alpha = "A" in image.getbands() or "transparency" in image.info
+        image = image.convert("RGBA" if has_alpha else "RGB")
+    else:
+        image.load()
+    return image
+
+
+def embed_body(path, output, chunks, body_size, flags, stream=False, bits_per_channel=1,
+               use_alpha=False, format="PNG", compress_level=None, threads=1, band_rows=256,
+               frames=False):
+    # Embeds an already prepared body and writes the result; returns the
+    # cover's pixel count. threads only applies to covers decoded whole.
+    if frames:
+        return multiframe.frame_encode_chunks(path, output, chunks, body_size, bits_per_channel,
+                                              use_alpha, flags, compress_level)
+    if stream:
+        streaming.stream_encode_chunks(
+            path, output, chunks, body_size, bits_per_channel=bits_per_channel,
+            use_alpha=use_alpha, flags=flags,
+            compress_level=stego.save_options("PNG", compress_level)["compress_level"])
+        with streaming.open_reader(output) as reader:
+            return reader.width * reader.height
+    image = open_cover(path)
+    stego.encode_stream(image, chunks, body_size, band_rows=band_rows,
+                        bits_per_channel=bits_per_channel, use_alpha=use_alpha, flags=flags,
+                        threads=threads)
+    stego.save_atomic(image, output, format, compress_level=compress_level)
+    return image.width * image.height
+
+
+def open_body_chunks(path, stream=False, threads=1, band_rows=256, frames=False):
+    # Returns (pixels, layout, chunks) where chunks is a generator of packed
+    # body bytes; close it when done
+    if frames:
+        layout, chunks = multiframe.frame_open_body(path)
+        return layout.width, layout, chunks
+    if stream:
+        with streaming.open_reader(path) as reader:
+            pixels = reader.width * reader.height
+        layout, chunks = streaming.stream_open_body(path)
+    else:
+        image = open_cover(path)
+        pixels = image.width * image.height
+        layout = stego.read_layout(image)
+        chunks = stego.iter_lsb_bytes(image, layout, max_band_rows=band_rows, threads=threads)
+    return pixels, layout, chunks
+
+
+def embed_file(path, output, message, key, stream=False, bits_per_channel=1, use_alpha=False,
+               compression="none", level=None, payload_path=None, format="PNG", compress_level=None,
+               threads=1, band_rows=256, frames=False):
+    started = time.perf_counter()
+    result = {"command": "embed", "input": path, "output": output}
+    try:
+        generated = key is None
+        if generated:
+            key = Fernet.generate_key().decode()
+
+        with open(payload_path, "rb") if payload_path else contextlib.nullcontext() as payload_file:
+            if payload_file:
+                # Files are encrypted chunk by chunk as the embed reaches them
+                flags = payload.CHUNKED
+                body_size = payload.chunked_size(os.fstat(payload_file.fileno()).st_size)
+                chunks = payload.encrypt_chunks(key, payload_file)
+            else:
+                flags, token = payload.seal(message, key, compression, level)
+                body_size = len(token)
+                chunks = [token]
+
+            pixels = embed_body(path, output, chunks, body_size, flags, stream, bits_per_channel,
+                                use_alpha, format, compress_level, threads, band_rows, frames)
+
+        result.update(status="ok", pixels=pixels, bytes=body_size)
+        if generated:
+            result["key"] = key
+    except Exception as e:
+        result.update(status="error", error=str(e))
+    result["seconds"] = round(time.perf_counter() - started, 6)
+    return result
+
+
+def extract_file(path, output, key, stream=False, threads=1, band_rows=256, frames=False):
+    started = time.perf_counter()
+    result = {"command": "extract", "input": path}
+    chunks = None
+    try:
+        pixels, layout, chunks = open_body_chunks(path, stream, threads, band_rows, frames)
+        if layout.flags & payload.SHARDED:
+            raise ValueError("This image holds one shard of a larger payload; "
+                             "extract the whole set with --shards")
+        if layout.frames and not frames:
+            raise ValueError("This payload continues through the image's frames; "
+                             "extract it with --frames")
+
+        if layout.flags & payload.CHUNKED:
+            if not output:
+                raise ValueError("This image carries a file; use --out-dir to extract it")
+            output = os.path.splitext(output)[0] + ".bin"
+            reader = stego.BodyReader(chunks)
+            size = payload.write_chunks_atomic(output, payload.decrypt_chunks(key, reader.read))
+            result.update(status="ok", pixels=pixels, bytes=size, output=output)
+        else:
+            token = stego.read_payload(chunks, layout)
+            message = payload.unseal(token, key, layout.flags).decode()
+
+            if output:
+                os.makedirs(os.path.dirname(output) or ".", exist_ok=True)
+                with open(output, "w", encoding="utf-8") as f:
+                    f.write(message)
+                result["output"] = output
+
+            result.update(status="ok", pixels=pixels, bytes=len(token), message=message)
+    except Exception as e:
+        result.update(status="error", error=str(e) or type(e).__name__)
+    finally:
+        if chunks is not None:
+            chunks.close()
+    result["seconds"] = round(time.perf_counter() - started, 6)
+    return result
+
+
+def load_completed(results_path, command):
+    completed = set()
+    if not results_path or not os.path.exists(results_path):
+        return completed
+    with open(results_path, encoding="utf-8") as f:
+        for line in f:
+            try:
+                record = json.loads(line)
+            except ValueError:
+                continue
+            if record.get("command") == command and record.get("status") == "ok":
+                completed.add(os.path.abspath(record["input"]))
+    return completed
+
+
+def build_jobs(args):
+    completed = load_completed(args.results, args.command) if args.resume else set()
+    jobs, skipped = [], []
+    for path, base in expand_inputs(args.inputs):
+        if args.command == "embed":
+            # Animations come out as APNG and TIFFs as TIFF with --frames
+            extension = (multiframe.output_extension(path) if args.frames
+                         else stego.OUTPUT_FORMATS[args.format])
+            output = output_path(path, base, args.out_dir, args.suffix, extension)
+            done = os.path.exists(output) or os.path.abspath(path) in completed
+            job = (embed_file, path, output, args.message, args.key, args.stream,
+                   args.bits, args.alpha, args.compress, args.level, args.file,
+                   args.format, args.compress_level, args.threads, args.band_rows, args.frames)
+        else:
+            output = output_path(path, base, args.out_dir, "", ".txt") if args.out_dir else None
+            done = os.path.abspath(path) in completed
+            job = (extract_file, path, output, args.key, args.stream, args.threads,
+                   args.band_rows, args.frames)
+
+        if args.resume and done:
+            skipped.append(path)
+        else:
+            jobs.append(job)
+    return jobs, skipped
+
+
+def run_jobs(jobs, workers, on_result):
+    if workers == 1:
+        for func, *job_args in jobs:
+            on_result(func(*job_args))
+        return
+
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        futures = [executor.submit(func, *job_args) for func, *job_args in jobs]
+        for future in as_completed(futures):
+            on_result(future.result())
+
+
+def run_album(args, jobs, on_result):
+    # --shards: the inputs together carry one payload
+    import shards
+    paths = [job[1] for job in jobs]
+    workers = max(1, args.workers)
+    if args.command == "embed":
+        outputs = [job[2] for job in jobs]
+        return shards.embed_album(paths, outputs, args.message, args.key, args.file, args.compress,
+                                  args.level, args.bits, args.alpha, args.stream, args.format,
+                                  args.compress_level, workers, on_result)
+    return shards.extract_album(paths, args.key, args.out_dir, args.stream, workers, on_result)
+
+
+def read_key(args):
+    if args.key_file:
+        with open(args.key_file, encoding="utf-8") as f:
+            return f.read().strip()
+    return args.key
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Batch image steganography without the GUI")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    common = argparse.ArgumentParser(add_help=False)
+    common.add_argument("inputs", nargs="+", help="Image files, glob patterns or directories")
+    common.add_argument("--workers", type=int, default=os.cpu_count() or 1,
+                        help="Number of worker processes (default: CPU count)")
+    common.add_argument("--threads", type=int, default=1,
+                        help="Threads working on the row bands of each image, for a few very "
+                             "large images (default: 1; not used with --stream)")
+    common.add_argument("--band-rows", type=int, default=256,
+                        help="Rows per band handed to a thread, rounded up to a multiple of 8 "
+                             "(default: 256)")
+    common.add_argument("--results", help="Append one JSON line per file to this file")
+    common.add_argument("--resume", action="store_true",
+                        help="Skip files already completed in a previous run")
+    common.add_argument("--key", help="Fernet key")
+    common.add_argument("--key-file", help="File containing the Fernet key")
+    common.add_argument("--stream", action="store_true",
+                        help="Process PNG/PPM files in row bands instead of decoding them whole")
+    common.add_argument("--frames", action="store_true",
+                        help="Use every frame of animated PNG/GIF/WebP and multi-page TIFF "
+                             "covers, one frame at a time (animations are written as APNG)")
+    common.add_argument("--shards", action="store_true",
+                        help="Treat the inputs as one set: spread a single payload across "
+                             "them (embed) or reassemble it from them in any order (extract)")
+    common.add_argument("--quiet", action="store_true", help="Only print the summary")
+
+    embed = subparsers.add_parser("embed", parents=[common],
+                                  help="Encrypt a message and hide it in each image")
+    message = embed.add_mutually_exclusive_group(required=True)
+    message.add_argument("--message", help="Message to hide")
+    message.add_argument("--message-file", help="File containing the message to hide")
+    message.add_argument("--file", help="Hide this file (any size or type) as an encrypted "
+                                        "chunked payload; extract writes it back as .bin")
+    embed.add_argument("--out-dir", required=True, help="Directory for the encoded images")
+    embed.add_argument("--suffix", default="_encrypted", help="Suffix added to output names")
+    embed.add_argument("--bits", type=int, default=1, choices=range(1, stego.MAX_BITS_PER_CHANNEL + 1),
+                       help="Low bits used per colour channel (default: 1)")
+    embed.add_argument("--alpha", action="store_true",
+                       help="Also embed in the alpha channel of RGBA covers")
+    embed.add_argument("--compress", default="zlib", choices=sorted(payload.CODECS),
+                       help="Compress the message before encryption when it helps (default: zlib)")
+    embed.add_argument("--level", type=int, help="Compression level for --compress")
+    embed.add_argument("--format", default="PNG", type=str.upper, choices=list(stego.OUTPUT_FORMATS),
+                       help="Lossless output format (default: PNG)")
+    embed.add_argument("--compress-level", type=int, choices=range(10),
+                       help="Output encoder effort from 0 (fastest, largest) to 9 (smallest) "
+                            f"(default: {stego.DEFAULT_COMPRESS_LEVEL})")
+    embed.add_argument("--email", help="Email the key and an OTP for each image to this address")
+    embed.add_argument("--email-timeout", type=float, default=60,
+                       help="Seconds to wait for queued emails before exiting (default: 60)")
+
+    extract = subparsers.add_parser("extract", parents=[common],
+                                    help="Extract and decrypt the message from each image")
+    extract.add_argument("--out-dir", help="Write each message to a .txt file in this directory")
+
+    args = parser.parse_args(argv)
+    args.key = read_key(args)
+    if args.command == "extract" and not args.key:
+        parser.error("extract requires --key or --key-file")
+    if args.command == "embed":
+        if args.message_file:
+            with open(args.message_file, "rb") as f:
+                args.message = f.read()
+        elif args.file:
+            args.message = None
+        else:
+            args.message = args.message.encode()
+    if args.command == "embed" and args.stream and args.format != "PNG":
+        parser.error("--stream only writes PNG output")
+    if args.command == "embed" and not args.key and not args.results:
+        parser.error("embed without --key requires --results to record the generated keys")
+    if args.frames and (args.stream or args.shards):
+        parser.error("--frames cannot be combined with --stream or --shards")
+    if args.command == "embed" and args.frames and args.format != "PNG":
+        parser.error("--frames keeps the cover's container (APNG or TIFF); drop --format")
+    if args.threads < 1 or args.band_rows < 1:
+        parser.error("--threads and --band-rows must be at least 1")
+    if args.shards and args.resume:
+        parser.error("--resume cannot be combined with --shards")
+    if args.resume and args.command == "extract" and not args.results:
+        parser.error("--resume for extract requires --results")
+    return args
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    jobs, skipped = build_jobs(args)
+    for path in skipped:
+        if not args.quiet:
+            print(f"skip   {path}")
+
+    results_file = open(args.results, "a", encoding="utf-8") if args.results else None
+    results_lock = threading.Lock()
+    totals = {"ok": 0, "error": 0, "seconds": 0.0, "pixels": 0}
+    sender = mailer.KeySender().start() if getattr(args, "email", None) else None
+    deliveries = []
+
+    def record(result):
+        # Decrypted messages stay out of the results file; it is closed under
+        # the lock, so a delivery reported after that is dropped
+        result = {k: v for k, v in result.items() if k != "message"}
+        with results_lock:
+            if results_file and not results_file.closed:
+                results_file.write(json.dumps(result) + "\n")
+                results_file.flush()
+
+    def on_delivery(path, delivery):
+        if delivery.status in (mailer.SENT, mailer.FAILED):
+            record({"command": "email", "input": path, "status": delivery.status,
+                    "error": delivery.error, "message_id": delivery.id})
+
+    def on_result(result):
+        totals[result["status"]] += 1
+        totals["seconds"] += result["seconds"]
+        totals["pixels"] += result.get("pixels", 0)
+        record(result)
+        if not args.quiet:
+            detail = result.get("output", "") if result["status"] == "ok" else result["error"]
+            print(f"{result['status']:<6} {result['input']}  {result['seconds']:.3f}s  {detail}")
+        if "message" in result and "output" not in result:
+            # Without --out-dir the message is only ever shown here
+            print(result["message"])
+        if sender and result["status"] == "ok" and not args.shards:
+            send_key(result, result["input"])
+
+    def send_key(result, path):
+        otp = ''.join(random.choices(string.ascii_uppercase + string.digits, k=6))
+        deliveries.append(sender.enqueue(
+            args.email, result.get("key", args.key), otp,
+            callback=lambda delivery: on_delivery(path, delivery)))
+
+    started = time.perf_counter()
+    album = None
+    try:
+        if args.shards:
+            # One key for the whole set, sent once
+            album = run_album(args, jobs, on_result)
+            record(album)
+            if sender and album["status"] == "ok":
+                send_key(album, args.out_dir)
+        else:
+            run_jobs(jobs, max(1, args.workers), on_result)
+        if sender:
+            deadline = time.monotonic() + args.email_timeout
+            for delivery in deliveries:
+                delivery.wait(max(0, deadline - time.monotonic()))
+    finally:
+        if sender:
+            # Lets a send in progress finish and report before the file closes
+            sender.stop(timeout=sender.timeout + 5)
+        if results_file:
+            with results_lock:
+                results_file.close()
+    wall = time.perf_counter() - started
+
+    megapixels = totals["pixels"] / 1e6
+    print(f"{totals['ok']} ok, {totals['error']} failed, {len(skipped)} skipped "
+          f"in {wall:.2f}s wall ({totals['seconds']:.2f}s in workers, "
+          f"{megapixels / wall if wall else 0:.1f} MP/s)", file=sys.stderr)
+    if album:
+        if album["status"] == "ok":
+            print(f"shards: payload {album['payload_id']} ({album['bytes']} bytes) in "
+                  f"{album['shards']} images", file=sys.stderr)
+            if "message" in album and "output" not in album:
+                print(album["message"])
+        else:
+            print(f"shards: {album['error']}", file=sys.stderr)
+    if deliveries:
+        sent = sum(delivery.status == mailer.SENT for delivery in deliveries)
+        failed = sum(delivery.status == mailer.FAILED for delivery in deliveries)
+        print(f"email: {sent} sent, {failed} failed, {len(deliveries) - sent - failed} "
+              f"still queued in {sender.outbox.directory}", file=sys.stderr)
+    return 1 if totals["error"] or (album and album["status"] != "ok") else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
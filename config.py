@@ -2,3 +2,32 @@
 class Config:
     SENDER_EMAIL = "Your Email"
     SENDER_PASSWORD = "Your app password"
+    SMTP_SERVER = "smtp.gmail.com"
+    SMTP_PORT = 587
+    SMTP_USE_TLS = True
+    # Pending key emails are spooled here until the mail server accepts them
+    OUTBOX_DIR = "outbox"
+    # Rendered preview thumbnails; set PREVIEW_CACHE_DIR to None to keep them in memory only
+    PREVIEW_CACHE_DIR = ".preview_cache"
+    PREVIEW_CACHE_MB = 64
+    # Rendered tiles of zoomed-in previews, kept in memory only
+    PREVIEW_TILE_CACHE_MB = 96
+    # Resized icon artwork, keyed on the source file hash
+    ASSET_CACHE_DIR = ".asset_cache"
+    # Message compression before encryption: "none", "zlib", "lzma" or "zstd"
+    COMPRESSION = "zlib"
+    COMPRESSION_LEVEL = None
+    # Encoded image output: "PNG", "WEBP", "TIFF" or "BMP" (all lossless), and
+    # the encoder effort from 0 (fastest, largest file) to 9 (smallest)
+    OUTPUT_FORMAT = "PNG"
+    OUTPUT_COMPRESS_LEVEL = 6
+    # Threads embedding/extracting row bands of one image (None = one per
+    # CPU) and the rows in each band
+    EMBED_THREADS = None
+    EMBED_BAND_ROWS = 256
+    # Stage timings: shown in the status bar when enabled, appended as JSON
+    # lines to METRICS_LOG and dumped in Prometheus text format to
+    # METRICS_PROMETHEUS after each operation (setting either enables them)
+    METRICS_ENABLED = False
+    METRICS_LOG = None
+    METRICS_PROMETHEUS = None
@@ -0,0 +1,227 @@
+# mailer.py
+# Key/OTP delivery through an on-disk outbox drained by one background sender
+# that keeps a single authenticated SMTP session open
+import json
+import os
+import queue
+import smtplib
+import threading
+import time
+import uuid
+from email.mime.multipart import MIMEMultipart
+from email.mime.text import MIMEText
+
+import metrics
+from config import Config
+
+QUEUED, RETRYING, SENT, FAILED = "queued", "retrying", "sent", "failed"
+
+
+def build_key_message(sender_email, recipient_email, key, otp):
+    message = MIMEMultipart()
+    message["From"] = sender_email
+    message["To"] = recipient_email
+    message["Subject"] = "Steganography Decryption Key"
+
+    body = f"""
+        Hello,
+
+        Here is your decryption key and OTP for the steganography image:
+
+        Decryption Key: {key}
+        OTP: {otp}
+
+        Please keep this information secure and do not share it with anyone.
+
+        Best regards,
+        Image Steganography App
+        """
+
+    message.attach(MIMEText(body, "plain"))
+    return message
+
+
+def is_permanent(error):
+    # 5xx replies to a message are final; a rejected login is a configuration
+    # problem and the message stays queued until it can be sent. Refused
+    # recipients carry their own codes, so greylisting (4xx) is retried.
+    if isinstance(error, smtplib.SMTPRecipientsRefused):
+        return all(code >= 500 for code, _ in error.recipients.values())
+    return (isinstance(error, smtplib.SMTPResponseException)
+            and not isinstance(error, smtplib.SMTPAuthenticationError)
+            and error.smtp_code >= 500)
+
+
+class Outbox:
+    # pending/ holds messages still to be sent (including the key, readable by
+    # the owner only); sent/ and failed/ keep a key-less delivery record
+    def __init__(self, directory):
+        self.directory = directory
+        for state in ("pending", SENT, FAILED):
+            os.makedirs(os.path.join(directory, state), exist_ok=True)
+
+    def _path(self, state, message_id):
+        return os.path.join(self.directory, state, f"{message_id}.json")
+
+    def _write(self, path, record):
+        temp_path = f"{path}.tmp"
+        fd = os.open(temp_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            json.dump(record, f)
+        os.replace(temp_path, path)
+
+    def add(self, recipient_email, key, otp):
+        record = {"id": uuid.uuid4().hex, "recipient": recipient_email, "key": key,
+                  "otp": otp, "created": time.time(), "attempts": 0}
+        self._write(self._path("pending", record["id"]), record)
+        return record
+
+    def pending(self):
+        records = []
+        pending_dir = os.path.join(self.directory, "pending")
+        for name in os.listdir(pending_dir):
+            if name.endswith(".json"):
+                with open(os.path.join(pending_dir, name), encoding="utf-8") as f:
+                    records.append(json.load(f))
+        return sorted(records, key=lambda record: record["created"])
+
+    def complete(self, record, status, error=None):
+        summary = {k: record[k] for k in ("id", "recipient", "created", "attempts")}
+        summary.update(status=status, error=error, completed=time.time())
+        self._write(self._path(status, record["id"]), summary)
+        try:
+            os.remove(self._path("pending", record["id"]))
+        except FileNotFoundError:
+            # Another sender sharing the outbox (the GUI and the CLI) got there first
+            pass
+
+
+class Delivery:
+    def __init__(self, record, callback=None):
+        self.record = record
+        self.id = record["id"]
+        self.status = QUEUED
+        self.error = None
+        self.callback = callback
+        self.finished = threading.Event()
+
+    def update(self, status, error=None):
+        self.status = status
+        self.error = error
+        if status in (SENT, FAILED):
+            self.finished.set()
+        if self.callback:
+            self.callback(self)
+
+    def wait(self, timeout=None):
+        self.finished.wait(timeout)
+        return self.status
+
+
+class KeySender:
+    def __init__(self, outbox_dir=None, host=None, port=None, sender_email=None, username=None,
+                 password=None, use_tls=None, timeout=30, max_backoff=300, idle_timeout=60):
+        self.outbox = Outbox(outbox_dir or Config.OUTBOX_DIR)
+        self.host = host or Config.SMTP_SERVER
+        self.port = port or Config.SMTP_PORT
+        self.sender_email = sender_email or Config.SENDER_EMAIL
+        self.username = self.sender_email if username is None else username
+        self.password = Config.SENDER_PASSWORD if password is None else password
+        self.use_tls = Config.SMTP_USE_TLS if use_tls is None else use_tls
+        self.timeout = timeout
+        self.max_backoff = max_backoff
+        self.idle_timeout = idle_timeout
+
+        self.queue = queue.Queue()
+        self.stopping = threading.Event()
+        self.smtp = None
+        self.thread = None
+
+    def start(self):
+        # Anything left in the spool by a previous run is sent first
+        for record in self.outbox.pending():
+            self.queue.put(Delivery(record))
+        self.thread = threading.Thread(target=self._run, daemon=True)
+        self.thread.start()
+        return self
+
+    def enqueue(self, recipient_email, key, otp, callback=None):
+        delivery = Delivery(self.outbox.add(recipient_email, key, otp), callback)
+        self.queue.put(delivery)
+        return delivery
+
+    def stop(self, timeout=None):
+        self.stopping.set()
+        self.queue.put(None)
+        if self.thread:
+            self.thread.join(timeout)
+
+    def _run(self):
+        while not self.stopping.is_set():
+            try:
+                delivery = self.queue.get(timeout=self.idle_timeout)
+            except queue.Empty:
+                # Don't hold an idle session open indefinitely
+                self._disconnect()
+                continue
+            if delivery is None:
+                break
+            self._deliver(delivery)
+        self._disconnect()
+
+    def _connect(self):
+        if self.smtp is None:
+            with metrics.span("smtp_connect"):
+                smtp = smtplib.SMTP(self.host, self.port, timeout=self.timeout)
+            try:
+                if self.use_tls:
+                    with metrics.span("smtp_starttls"):
+                        smtp.starttls()
+                if self.username and self.password:
+                    with metrics.span("smtp_login"):
+                        smtp.login(self.username, self.password)
+            except Exception:
+                smtp.close()
+                raise
+            self.smtp = smtp
+        return self.smtp
+
+    def _disconnect(self):
+        if self.smtp is not None:
+            try:
+                self.smtp.quit()
+            except (smtplib.SMTPException, OSError):
+                self.smtp.close()
+            self.smtp = None
+
+    def _deliver(self, delivery):
+        record = delivery.record
+        message = build_key_message(self.sender_email, record["recipient"], record["key"], record["otp"])
+        backoff = 1
+        while not self.stopping.is_set():
+            record["attempts"] += 1
+            try:
+                smtp = self._connect()
+                with metrics.span("smtp_send", attempt=record["attempts"]):
+                    smtp.send_message(message)
+            except ValueError as e:
+                # The message is malformed; retrying won't help
+                self._fail(delivery, e)
+                return
+            except (smtplib.SMTPException, OSError) as e:
+                if is_permanent(e):
+                    self._fail(delivery, e)
+                    return
+                self._disconnect()
+                metrics.count("smtp_retries")
+                delivery.update(RETRYING, str(e))
+                self.stopping.wait(backoff)
+                backoff = min(backoff * 2, self.max_backoff)
+            else:
+                self.outbox.complete(record, SENT)
+                delivery.update(SENT)
+                return
+
+    def _fail(self, delivery, error):
+        self.outbox.complete(delivery.record, FAILED, str(error))
+        delivery.update(FAILED, str(error))
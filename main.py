@@ -1,14 +1,22 @@
+import time
+# Taken before the remaining imports so startup time includes them
+STARTED = time.perf_counter()
 import tkinter as tk
 from tkinter import filedialog, messagebox, ttk
 from PIL import Image, ImageTk
 import random
 import string
-from cryptography.fernet import Fernet
-import smtplib
-from email.mime.text import MIMEText
-from email.mime.multipart import MIMEMultipart
 import os
+import metrics
 from config import Config
+from preview_cache import PreviewCache, load_resized_asset
+from pyramid import ImagePyramid, TileCache, Viewport, ZOOM_STEP, load_source, payload_region, region_rects
+from tasks import BackgroundTask, OperationCancelled
+# cryptography, numpy (via stego) and smtplib/email (via mailer) are imported
+# on first use so launching and previewing don't pay for them
+
+# How long the GUI waits for the mail server before reporting the key as queued
+EMAIL_WAIT_SECONDS = 30
 class SteganographyApp:
     def __init__(self):
         self.root = tk.Tk()
@@ -21,19 +29,29 @@ class SteganographyApp:
         
         # Initialize variables
         self.current_image = None
+        self.task = None
+        self.key_sender = None
+        if Config.METRICS_ENABLED or Config.METRICS_LOG or Config.METRICS_PROMETHEUS:
+            metrics.configure(True, Config.METRICS_LOG)
+        self.preview_cache = PreviewCache(max_bytes=Config.PREVIEW_CACHE_MB << 20,
+                                          disk_dir=Config.PREVIEW_CACHE_DIR)
+        # Zoomed-in views of the previewed image
+        self.tile_cache = TileCache(max_bytes=Config.PREVIEW_TILE_CACHE_MB << 20)
+        self.pyramid = None
+        self.viewport = None
+        self.fit_photo = None
+        self.pan_from = None
         self.setup_styles()
         self.create_main_interface()
         
     def load_application_images(self):
         try:
             # Load hide icon
-            self.hide_image = Image.open("hide.png")
-            self.hide_image = self.hide_image.resize((80, 80), Image.Resampling.LANCZOS)
+            self.hide_image = load_resized_asset("hide.png", (80, 80), Config.ASSET_CACHE_DIR)
             self.hide_photo = ImageTk.PhotoImage(self.hide_image)
             
             # Load lock image
-            self.lock_image = Image.open("lock_image.png")
-            self.lock_image = self.lock_image.resize((450, 450), Image.Resampling.LANCZOS)
+            self.lock_image = load_resized_asset("lock_image.png", (450, 450), Config.ASSET_CACHE_DIR)
             self.lock_photo = ImageTk.PhotoImage(self.lock_image)
         except Exception as e:
             print(f"Error loading images: {e}")
@@ -93,6 +111,18 @@ class SteganographyApp:
         # Default preview image
         self.display_default_preview()
 
+        # Mouse wheel zooms, dragging pans and a double-click fits the image
+        self.show_payload = tk.BooleanVar(value=False)
+        tk.Checkbutton(self.left_panel,
+                      text="Highlight payload region",
+                      variable=self.show_payload,
+                      command=self.draw_preview,
+                      bg="#2d2d2d",
+                      fg="white",
+                      selectcolor="#1e1e1e",
+                      activebackground="#2d2d2d",
+                      activeforeground="white").pack()
+
         # Right panel for controls
         self.right_panel = tk.Frame(self.main_container, bg="#1e1e1e")
         self.right_panel.pack(side=tk.LEFT, fill="both", expand=True)
@@ -140,6 +170,7 @@ class SteganographyApp:
             ("Clear Preview", self.clear_preview, "#f44336", "Clear the current image preview")
         ]
 
+        self.control_buttons = []
         for text, command, color, tooltip in button_configs:
             btn_frame = tk.Frame(buttons_frame, bg="#1e1e1e")
             btn_frame.pack(pady=10)
@@ -155,6 +186,7 @@ class SteganographyApp:
                           height=2,
                           cursor="hand2")
             btn.pack()
+            self.control_buttons.append(btn)
             
             # Tooltip label
             tk.Label(btn_frame,
@@ -167,6 +199,28 @@ class SteganographyApp:
             btn.bind("<Enter>", lambda e, b=btn: b.configure(bg=self.adjust_color(b.cget("bg"), 1.1)))
             btn.bind("<Leave>", lambda e, b=btn, c=color: b.configure(bg=c))
 
+        # Progress of the running background operation
+        progress_frame = tk.Frame(buttons_frame, bg="#1e1e1e")
+        progress_frame.pack(pady=10)
+
+        self.progress_var = tk.DoubleVar(value=0)
+        self.progress_bar = ttk.Progressbar(progress_frame,
+                                            variable=self.progress_var,
+                                            maximum=100,
+                                            mode="determinate",
+                                            length=260)
+        self.progress_bar.pack(side=tk.LEFT, padx=5)
+
+        self.cancel_button = tk.Button(progress_frame,
+                                     text="Cancel",
+                                     command=self.cancel_task,
+                                     font=("Helvetica", 10),
+                                     bg="#f44336",
+                                     fg="white",
+                                     relief=tk.FLAT,
+                                     state=tk.DISABLED)
+        self.cancel_button.pack(side=tk.LEFT, padx=5)
+
     def display_default_preview(self):
         # Create a default preview canvas with lock image
         self.preview_canvas = tk.Canvas(self.preview_frame,
@@ -176,6 +230,12 @@ class SteganographyApp:
                                       highlightthickness=1,
                                       highlightbackground="#404040")
         self.preview_canvas.pack()
+        self.preview_canvas.bind("<MouseWheel>", self.zoom_preview)
+        self.preview_canvas.bind("<Button-4>", self.zoom_preview)
+        self.preview_canvas.bind("<Button-5>", self.zoom_preview)
+        self.preview_canvas.bind("<ButtonPress-1>", self.start_pan)
+        self.preview_canvas.bind("<B1-Motion>", self.pan_preview)
+        self.preview_canvas.bind("<Double-Button-1>", self.fit_preview)
         
         if self.lock_photo:
             # If we have a lock image, display it
@@ -199,34 +259,21 @@ class SteganographyApp:
         b = int(min(255, int(color[5:7], 16) * factor))
         return f"#{r:02x}{g:02x}{b:02x}"
 
-    def update_preview(self, image_path):
+    def update_preview(self, image_path, image=None):
+        # image: the file's pixels when they are already in memory, so zooming
+        # in doesn't decode the file again
         try:
-            image = Image.open(image_path)
-            # Store the current image
-            self.current_image = image
-            
-            # Calculate aspect ratio
-            aspect_ratio = image.width / image.height
-            
-            # Determine new dimensions while maintaining aspect ratio
-            if aspect_ratio > 1:
-                new_width = 450
-                new_height = int(450 / aspect_ratio)
-            else:
-                new_height = 450
-                new_width = int(450 * aspect_ratio)
-            
-            # Resize image
-            image = image.resize((new_width, new_height), Image.Resampling.LANCZOS)
-            photo = ImageTk.PhotoImage(image)
+            # Thumbnails come from the preview cache, which decodes at reduced
+            # resolution and only when the file is new or has changed
+            with metrics.span("preview"):
+                self.fit_photo = self.preview_cache.get(image_path, ImageTk.PhotoImage)
+                self.tile_cache.clear()
+                self.pyramid = ImagePyramid(image_path, image, self.preview_cache.get(image_path))
+                self.viewport = Viewport(self.pyramid.width, self.pyramid.height, 450, 450)
+            self.current_image = image_path
             
             # Update canvas
-            self.preview_canvas.delete("all")
-            self.preview_canvas.create_image(225,
-                                          225,
-                                          image=photo,
-                                          anchor=tk.CENTER)
-            self.preview_canvas.image = photo
+            self.draw_preview()
             
             # Update status
             self.status_var.set(f"Image loaded: {os.path.basename(image_path)}")
@@ -235,9 +282,126 @@ class SteganographyApp:
             messagebox.showerror("Error", f"Failed to load image: {str(e)}")
             self.status_var.set("Error loading image")
 
+    def draw_preview(self):
+        if self.pyramid is None:
+            return
+        canvas, pyramid, viewport = self.preview_canvas, self.pyramid, self.viewport
+        canvas.delete("all")
+        if viewport.fitted:
+            # The whole image is the cached thumbnail
+            canvas.create_image(225, 225, image=self.fit_photo, anchor=tk.CENTER)
+            drawn = [self.fit_photo]
+        else:
+            # Only the tiles in view are rendered, from the pyramid level
+            # closest to the zoom; until the file is decoded the thumbnail is
+            # stretched in its place
+            number, image = pyramid.best_level(viewport.zoom)
+            if number is None:
+                self.load_full_preview()
+            drawn = []
+            for tile in pyramid.tiles(viewport, number, image):
+                photo = self.tile_cache.get(tile.key,
+                                            lambda: pyramid.render_tile(number, image, tile),
+                                            ImageTk.PhotoImage)
+                canvas.create_image(*tile.position, image=photo, anchor=tk.NW)
+                drawn.append(photo)
+        # Tk drops an image once Python holds no reference to it
+        canvas.image = drawn
+        if self.show_payload.get():
+            self.draw_payload_overlay()
+
+    def load_full_preview(self):
+        pyramid = self.pyramid
+        if pyramid.loading:
+            return
+        pyramid.loading = True
+
+        def load(progress):
+            with metrics.span("preview_load", pixels=pyramid.width * pyramid.height):
+                return load_source(pyramid.path)
+
+        def loaded(image):
+            pyramid.loading = False
+            pyramid.set_source(image)
+            if pyramid is self.pyramid:
+                self.draw_preview()
+
+        def failed(error):
+            pyramid.loading = False
+            self.status_var.set(f"Could not load full resolution: {error}")
+
+        BackgroundTask(self.root, load, loaded, failed)
+
+    def draw_payload_overlay(self):
+        pyramid, viewport = self.pyramid, self.viewport
+        if not pyramid.region_checked:
+            self.find_payload_region()
+            return
+        if pyramid.region is None:
+            return
+        # Header pixels in orange, the body in green
+        for first, last, color in ((0, pyramid.region.start, "#ff9800"),
+                                   (pyramid.region.start, pyramid.region.end, "#4caf50")):
+            for left, top, right, bottom in region_rects(first, last, pyramid.width):
+                x0, y0 = viewport.to_canvas(left, top)
+                x1, y1 = viewport.to_canvas(right, bottom)
+                # Tk draws nothing for zero-size or far off-canvas rectangles
+                x0, y0 = max(x0, -2), max(y0, -2)
+                x1, y1 = min(max(x1, x0 + 1), 452), min(max(y1, y0 + 1), 452)
+                if x0 < 452 and y0 < 452:
+                    self.preview_canvas.create_rectangle(x0, y0, x1, y1, outline=color,
+                                                         fill=color, stipple="gray25")
+
+    def find_payload_region(self):
+        pyramid = self.pyramid
+        if pyramid.region_checked or pyramid.finding_region:
+            return
+        pyramid.finding_region = True
+
+        def found(region):
+            pyramid.finding_region = False
+            pyramid.region, pyramid.region_checked = region, True
+            if pyramid is self.pyramid:
+                if region is None:
+                    self.status_var.set("No hidden payload found in this image")
+                self.draw_preview()
+
+        def failed(error):
+            pyramid.finding_region = False
+            pyramid.region_checked = True
+            self.status_var.set(f"Could not read the payload region: {error}")
+
+        BackgroundTask(self.root, lambda progress: payload_region(pyramid.path), found, failed)
+
+    def zoom_preview(self, event):
+        if self.pyramid is None:
+            return
+        zoom_in = event.num == 4 or event.delta > 0
+        self.viewport.zoom_at(ZOOM_STEP if zoom_in else 1 / ZOOM_STEP, event.x, event.y)
+        self.status_var.set(f"Zoom {self.viewport.zoom * 100:.0f}%")
+        self.draw_preview()
+
+    def start_pan(self, event):
+        self.pan_from = (event.x, event.y)
+
+    def pan_preview(self, event):
+        if self.pyramid is None or self.pan_from is None:
+            return
+        self.viewport.pan(event.x - self.pan_from[0], event.y - self.pan_from[1])
+        self.pan_from = (event.x, event.y)
+        self.draw_preview()
+
+    def fit_preview(self, event=None):
+        if self.pyramid is None:
+            return
+        self.viewport.fit()
+        self.draw_preview()
+
     def clear_preview(self):
         self.current_image = None
-        self.preview_canvas.delete("all")
+        self.pyramid = None
+        self.tile_cache.clear()
+        self.preview_canvas.destroy()
         self.display_default_preview()
         self.status_var.set("Preview cleared")
 
@@ -306,7 +470,48 @@ class SteganographyApp:
         return getattr(popup, 'result', None)
 
  
+    def start_task(self, status, job, on_done):
+        self.status_var.set(status)
+        self.progress_var.set(0)
+        self.set_busy(True)
+
+        def done(result):
+            self.task = None
+            self.set_busy(False)
+            self.progress_var.set(100)
+            on_done(result)
+
+        self.task = BackgroundTask(self.root, job, done, self.task_failed, self.update_progress)
+
+    def task_failed(self, error):
+        self.task = None
+        self.set_busy(False)
+        self.progress_var.set(0)
+        metrics.count("errors", error=type(error).__name__)
+        self.write_metrics()
+        if isinstance(error, OperationCancelled):
+            self.status_var.set("Operation cancelled")
+        else:
+            messagebox.showerror("Error", str(error))
+            self.status_var.set("Error occurred during operation")
+
+    def update_progress(self, done, total):
+        self.progress_var.set(100 * done / total if total else 0)
+
+    def set_busy(self, busy):
+        state = tk.DISABLED if busy else tk.NORMAL
+        for btn in self.control_buttons:
+            btn.configure(state=state)
+        self.cancel_button.configure(state=tk.NORMAL if busy else tk.DISABLED)
+
+    def cancel_task(self):
+        if self.task:
+            self.task.cancel()
+            self.status_var.set("Cancelling...")
+
     def encode_image(self):
+        if self.task:
+            return
         try:
             # Select image
             img_path = filedialog.askopenfilename(
@@ -318,10 +523,31 @@ class SteganographyApp:
             
             if not img_path:
                 return
-    
-            self.update_preview(img_path)
-            self.status_var.set("Image loaded successfully")
-    
+
+            metrics.recorder.begin("hide")
+
+            # The cover is decoded once; the preview, the embedding and the
+            # preview of the saved result all come from these pixels
+            def load(progress):
+                with metrics.span("open") as span:
+                    image = Image.open(img_path)
+                    image.load()
+                    span.set(pixels=image.width * image.height)
+                with metrics.span("preview_resize"):
+                    self.preview_cache.put(img_path, image)
+                return image
+
+            self.start_task("Loading image...", load,
+                            lambda image: self.request_message(img_path, image))
+                
+        except Exception as e:
+            messagebox.showerror("Error", str(e))
+            self.status_var.set("Error occurred during encoding")
+
+    def request_message(self, img_path, newimg):
+        self.update_preview(img_path)
+        self.status_var.set("Image loaded successfully")
+        try:
             # Get message to hide
             text_input = self.create_popup(
                 "Hide Message",
@@ -332,55 +558,103 @@ class SteganographyApp:
             if not text_input or not text_input["Message"]:
                 return
     
-            # Process image
-            image = Image.open(img_path)
-            newimg = image.copy()
-            
-            # Encrypt message
-            key = Fernet.generate_key()
-            cipher_suite = Fernet(key)
-            encrypted_text = cipher_suite.encrypt(text_input["Message"].encode())
-            
-            # Generate OTP
-            otp = ''.join(random.choices(string.ascii_uppercase + string.digits, k=6))
-            
-            # Encode the encrypted message
-            self.encode_enc(newimg, encrypted_text)
-            
-            # Create default encrypted filename
-            original_filename = os.path.splitext(os.path.basename(img_path))[0]
-            default_save_name = f"{original_filename}_encrypted.png"
-            
-            # Save the new image with default name
-            save_path = filedialog.asksaveasfilename(
-                initialfile=default_save_name,
-                defaultextension=".png",
-                filetypes=(("PNG files", "*.png"), ("All files", "*.*"))
-            )
-            
-            if save_path:
-                newimg.save(save_path)
-                self.update_preview(save_path)
+            def embed(progress):
+                from cryptography.fernet import Fernet
+                import payload
+
+                # Compress (when it helps) and encrypt message
+                key = Fernet.generate_key()
+                with metrics.span("encrypt") as span:
+                    flags, encrypted_text = payload.seal(text_input["Message"].encode(), key,
+                                                         Config.COMPRESSION,
+                                                         Config.COMPRESSION_LEVEL)
+                    span.set(bytes=len(encrypted_text))
                 
-                # Get email for sending key
-                email_input = self.create_popup(
-                    "Email Address",
-                    "Enter email to receive decryption key:",
-                    ["Email"]
-                )
+                # Generate OTP
+                otp = ''.join(random.choices(string.ascii_uppercase + string.digits, k=6))
                 
-                if email_input and email_input["Email"]:
-                    self.send_email(email_input["Email"], key.decode(), otp)
-                    messagebox.showinfo("Success", 
-                                      "Image saved and decryption key sent!")
-                    self.status_var.set("Operation completed successfully")
+                # Encode the encrypted message
+                self.encode_enc(newimg, encrypted_text, progress, flags)
+                return newimg, key, otp
+
+            self.start_task("Hiding message...",
+                            embed,
+                            lambda result: self.save_encoded_image(img_path, *result))
                 
         except Exception as e:
             messagebox.showerror("Error", str(e))
             self.status_var.set("Error occurred during encoding")
-    
+
+    def save_encoded_image(self, img_path, newimg, key, otp):
+        import stego
+        output_format = Config.OUTPUT_FORMAT.upper()
+        extension = stego.OUTPUT_FORMATS[output_format]
+
+        # Create default encrypted filename
+        original_filename = os.path.splitext(os.path.basename(img_path))[0]
+        default_save_name = f"{original_filename}_encrypted{extension}"
+        
+        # Save the new image with default name
+        save_path = filedialog.asksaveasfilename(
+            initialfile=default_save_name,
+            defaultextension=extension,
+            filetypes=((f"{output_format} files", f"*{extension}"), ("All files", "*.*"))
+        )
+        
+        if not save_path:
+            self.status_var.set("Save cancelled")
+            return
+
+        def save(progress):
+            with metrics.span("save", format=output_format) as span:
+                stego.save_atomic(newimg, save_path, output_format, progress,
+                                  Config.OUTPUT_COMPRESS_LEVEL)
+                span.set(bytes=os.path.getsize(save_path))
+            with metrics.span("preview_resize"):
+                self.preview_cache.put(save_path, newimg)
+
+        self.start_task("Saving image...",
+                        save,
+                        lambda result: self.deliver_key(save_path, key, otp, newimg))
+
+    def deliver_key(self, save_path, key, otp, image=None):
+        self.update_preview(save_path, image)
+        
+        # Get email for sending key
+        email_input = self.create_popup(
+            "Email Address",
+            "Enter email to receive decryption key:",
+            ["Email"]
+        )
+        
+        if email_input and email_input["Email"]:
+            def send(progress):
+                progress(0, 1)
+                return self.send_email(email_input["Email"], key.decode(), otp)
+
+            def sent(delivery):
+                import mailer
+                if delivery.status == mailer.SENT:
+                    messagebox.showinfo("Success", 
+                                      "Image saved and decryption key sent!")
+                    self.finish_status("Operation completed successfully")
+                elif delivery.status == mailer.FAILED:
+                    messagebox.showerror("Error",
+                                       f"Image saved, but the key could not be sent: {delivery.error}")
+                    self.finish_status("Decryption key delivery failed")
+                else:
+                    messagebox.showinfo("Queued",
+                                      "Image saved. The decryption key will be sent "
+                                      "as soon as the mail server is reachable.")
+                    self.finish_status("Decryption key queued for delivery")
+
+            self.start_task("Sending decryption key...", send, sent)
+        else:
+            self.finish_status("Image saved")
 
     def decode_image(self):
+        if self.task:
+            return
         try:
             # Select image
             img_path = filedialog.askopenfilename(
@@ -392,8 +666,23 @@ class SteganographyApp:
             if not img_path:
                 return
 
-            self.update_preview(img_path)
-            
+            metrics.recorder.begin("extract")
+
+            # A thumbnail that isn't cached yet means decoding the file, which
+            # for a large cover would freeze the window on the Tk thread
+            def load(progress):
+                with metrics.span("preview_resize"):
+                    self.preview_cache.get(img_path)
+
+            self.start_task("Loading image...", load, lambda result: self.request_key(img_path))
+
+        except Exception as e:
+            messagebox.showerror("Error", str(e))
+            self.status_var.set("Error occurred during decoding")
+
+    def request_key(self, img_path):
+        self.update_preview(img_path)
+        try:
             # Get decryption key and OTP
             key_input = self.create_popup(
                 "Decryption",
@@ -404,141 +693,145 @@ class SteganographyApp:
             if not key_input:
                 return
 
-            # Decrypt and show message
-            image = Image.open(img_path)
-            encrypted_text = self.decode_enc(image)
-            
-            try:
-                cipher_suite = Fernet(key_input["Key"].encode())
-                decrypted_text = cipher_suite.decrypt(encrypted_text).decode()
-                
-                result_popup = tk.Toplevel(self.root)
-                result_popup.title("Decoded Message")
-                result_popup.geometry("400x300")
-                result_popup.configure(bg="#1e1e1e")
-                
-                # Add hide icon to result popup
-                if self.hide_photo:
-                    tk.Label(result_popup,
-                            image=self.hide_photo,
-                            bg="#1e1e1e").pack(pady=(10, 0))
-                
-                text_widget = tk.Text(result_popup, 
-                                    wrap=tk.WORD,
-                                    width=40,
-                                    height=10,
-                                    bg="#2d2d2d",
-                                    fg="white")
-                text_widget.pack(padx=20, pady=20)
-                text_widget.insert(tk.END, decrypted_text)
-                text_widget.configure(state='disabled')
-                
-                self.status_var.set("Message decoded successfully")
-                
-            except Exception as e:
-                messagebox.showerror("Error", "Invalid key or corrupted message")
-                self.status_var.set("Decoding failed")
+            def extract(progress):
+                import payload
+                import stego
+
+                with metrics.span("open") as span:
+                    image = Image.open(img_path)
+                    image.load()
+                    span.set(pixels=image.width * image.height)
+                layout = stego.read_layout(image)
+                flags = layout.flags
+                if flags & payload.SHARDED:
+                    raise ValueError("This image holds one shard of a larger payload; "
+                                     "extract the whole set with cli.py --shards")
+                if layout.frames:
+                    raise ValueError("This payload continues through the image's frames; "
+                                     "extract it with cli.py --frames")
+                if flags & payload.CHUNKED:
+                    # Hidden files are decrypted straight to disk once the
+                    # user has picked where to put them
+                    return image
+                encrypted_text, flags = self.decode_enc(image, progress)
+                try:
+                    with metrics.span("decrypt", bytes=len(encrypted_text)):
+                        return payload.unseal(encrypted_text, key_input["Key"], flags).decode()
+                except Exception:
+                    raise ValueError("Invalid key or corrupted message")
+
+            def extracted(result):
+                if isinstance(result, str):
+                    self.show_decoded_message(result)
+                else:
+                    self.save_extracted_file(result, key_input["Key"])
+
+            self.start_task("Extracting message...", extract, extracted)
                 
         except Exception as e:
             messagebox.showerror("Error", str(e))
             self.status_var.set("Error occurred during decoding")
 
-    def encode_enc(self, image, message):
-        width, height = image.size
-        pixels = image.load()
-        
-        # Convert message to binary
-        binary_message = ''.join(format(byte, '08b') for byte in message)
-        message_length = len(binary_message)
+    def save_extracted_file(self, image, key):
+        save_path = filedialog.asksaveasfilename(title="Save Hidden File")
+        if not save_path:
+            self.status_var.set("Hidden file not saved")
+            return
+
+        def write(progress):
+            from cryptography.exceptions import InvalidTag
+            import payload
+            import stego
+
+            _, reader = stego.open_body(image, progress, Config.EMBED_THREADS or os.cpu_count() or 1)
+            try:
+                # Extraction and decryption are interleaved chunk by chunk
+                with metrics.span("extract_decrypt_file") as span:
+                    size = payload.write_chunks_atomic(save_path,
+                                                       payload.decrypt_chunks(key, reader.read))
+                    span.set(bytes=size)
+                return size
+            except (InvalidTag, ValueError):
+                raise ValueError("Invalid key or corrupted file")
+
+        self.start_task("Extracting file...", write,
+                        lambda size: self.finish_status(f"Hidden file saved ({size} bytes)"))
+
+    def show_decoded_message(self, decrypted_text):
+        result_popup = tk.Toplevel(self.root)
+        result_popup.title("Decoded Message")
+        result_popup.geometry("400x300")
+        result_popup.configure(bg="#1e1e1e")
         
-        if message_length > width * height * 3:
-            raise ValueError("Message too large for image")
+        # Add hide icon to result popup
+        if self.hide_photo:
+            tk.Label(result_popup,
+                    image=self.hide_photo,
+                    bg="#1e1e1e").pack(pady=(10, 0))
         
-        # Add terminator to binary message
-        binary_message += '1111111111111110'
+        text_widget = tk.Text(result_popup, 
+                            wrap=tk.WORD,
+                            width=40,
+                            height=10,
+                            bg="#2d2d2d",
+                            fg="white")
+        text_widget.pack(padx=20, pady=20)
+        text_widget.insert(tk.END, decrypted_text)
+        text_widget.configure(state='disabled')
         
-        idx = 0
-        for row in range(height):
-            for col in range(width):
-                if idx < len(binary_message):
-                    pixel = list(pixels[col, row])
-                    
-                    # Modify least significant bits
-                    for color_channel in range(3):
-                        if idx < len(binary_message):
-                            pixel[color_channel] = pixel[color_channel] & ~1 | int(binary_message[idx])
-                            idx += 1
-                    
-                    pixels[col, row] = tuple(pixel)
-                else:
-                    break
+        self.finish_status("Message decoded successfully")
 
-    def decode_enc(self, image):
-        width, height = image.size
-        pixels = image.load()
-        binary_message = []
-        
-        for row in range(height):
-            for col in range(width):
-                pixel = pixels[col, row]
-                
-                for color_channel in range(3):
-                    binary_message.append(str(pixel[color_channel] & 1))
-                
-                if len(binary_message) >= 16:
-                    if ''.join(binary_message[-16:]) == '1111111111111110':
-                        binary_message = binary_message[:-16]
-                        
-                        message_bytes = bytearray()
-                        for i in range(0, len(binary_message), 8):
-                            byte = binary_message[i:i+8]
-                            if len(byte) == 8:
-                                message_bytes.append(int(''.join(byte), 2))
-                        
-                        return bytes(message_bytes)
-        
-        raise ValueError("No hidden message found")
+    def finish_status(self, text):
+        # The last operation's stage timings go in the status bar
+        if metrics.recorder.enabled:
+            text = f"{text} ({metrics.recorder.summary()})"
+            self.write_metrics()
+        self.status_var.set(text)
+
+    def write_metrics(self):
+        if Config.METRICS_PROMETHEUS:
+            try:
+                metrics.recorder.write_prometheus(Config.METRICS_PROMETHEUS)
+            except OSError as e:
+                print(f"Could not write metrics: {e}")
+
+    def encode_enc(self, image, message, progress=None, flags=0):
+        import stego
+        with metrics.span("embed", bytes=len(message)) as span:
+            stego.embed(image, message, progress=progress, flags=flags,
+                        threads=Config.EMBED_THREADS or os.cpu_count() or 1,
+                        band_rows=Config.EMBED_BAND_ROWS)
+            span.set(pixels=stego.plan_capacity(image, len(message), flags=flags).pixels_touched)
+
+    def decode_enc(self, image, progress=None):
+        # Returns the embedded token and the header flags it was stored with
+        import stego
+        with metrics.span("extract") as span:
+            message, layout = stego.decode_message(image, progress,
+                                                   Config.EMBED_THREADS or os.cpu_count() or 1,
+                                                   Config.EMBED_BAND_ROWS)
+            span.set(pixels=layout.pixels_touched(len(message)), bytes=len(message))
+        return message, layout.flags
 
     def send_email(self, recipient_email, key, otp):
-        # Email configuration
-        sender_email = Config.SENDER_EMAIL
-        sender_password = Config.SENDER_PASSWORD
-        smtp_server = "smtp.gmail.com"
-        smtp_port = 587
-        
-        # Create message
-        message = MIMEMultipart()
-        message["From"] = sender_email
-        message["To"] = recipient_email
-        message["Subject"] = "Steganography Decryption Key"
-        
-        body = f"""
-        Hello,
-        
-        Here is your decryption key and OTP for the steganography image:
-        
-        Decryption Key: {key}
-        OTP: {otp}
-        
-        Please keep this information secure and do not share it with anyone.
-        
-        Best regards,
-        Image Steganography App
-        """
-        
-        message.attach(MIMEText(body, "plain"))
-        
-        try:
-            server = smtplib.SMTP(smtp_server, smtp_port)
-            server.starttls()
-            server.login(sender_email, sender_password)
-            server.send_message(message)
-            server.quit()
-            
-        except Exception as e:
-            raise Exception(f"Failed to send email: {str(e)}")
+        # Messages go through the outbox and a single long-lived SMTP session;
+        # anything not delivered in time stays queued and is retried
+        if self.key_sender is None:
+            import mailer
+            self.key_sender = mailer.KeySender().start()
+        delivery = self.key_sender.enqueue(recipient_email, key, otp)
+        delivery.wait(EMAIL_WAIT_SECONDS)
+        return delivery
+
+    def report_startup(self, event=None):
+        # Time from process start-up to the main window first being mapped
+        self.root.unbind("<Map>")
+        elapsed = time.perf_counter() - STARTED
+        print(f"Time to first window: {elapsed:.3f}s")
+        self.status_var.set(f"Ready (started in {elapsed:.2f}s)")
 
     def run(self):
+        self.root.bind("<Map>", self.report_startup)
         self.root.mainloop()
 
 if __name__ == "__main__":
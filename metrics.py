@@ -0,0 +1,175 @@
+# metrics.py
+# Timing spans and counters for the encode/decode/email stages. Disabled by
+# default, when span() hands back a shared no-op object; once configured,
+# every span is kept in per-stage totals, optionally appended to a JSON-lines
+# log, and can be dumped in the Prometheus text format.
+import json
+import os
+import sys
+import threading
+import time
+
+try:
+    import resource
+except ImportError:
+    resource = None
+
+
+def peak_rss_mb():
+    # ru_maxrss is in KiB on Linux and bytes on macOS; None where unavailable
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / (1 << 20) if sys.platform == "darwin" else peak / 1024
+
+
+class NullSpan:
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def set(self, **attrs):
+        pass
+
+
+NULL_SPAN = NullSpan()
+
+
+class Span:
+    def __init__(self, recorder, stage, attrs):
+        self.recorder = recorder
+        self.stage = stage
+        self.attrs = attrs
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        seconds = time.perf_counter() - self.started
+        record = {"ts": round(time.time(), 6), "operation": self.recorder.operation,
+                  "stage": self.stage, "seconds": round(seconds, 6)}
+        record.update(self.attrs)
+        peak = peak_rss_mb()
+        if peak is not None:
+            record["peak_rss_mb"] = round(peak, 1)
+        if exc_type:
+            record["error"] = exc_type.__name__
+        self.recorder.add(record)
+        return False
+
+    def set(self, **attrs):
+        # e.g. pixels touched or bytes embedded, known once the stage ran
+        self.attrs.update(attrs)
+
+
+class Recorder:
+    def __init__(self):
+        self.enabled = False
+        self.log_path = None
+        self.operation = None
+        self.last = []
+        self.stages = {}
+        self.counters = {}
+        self.lock = threading.Lock()
+
+    def configure(self, enabled=True, log_path=None):
+        self.enabled = enabled or bool(log_path)
+        self.log_path = log_path
+
+    def begin(self, operation):
+        # Spans up to the next begin() make up the "last operation"
+        with self.lock:
+            self.operation = operation
+            self.last = []
+        self.count("operations", operation=operation)
+
+    def add(self, record):
+        line = json.dumps(record) if self.log_path else None
+        with self.lock:
+            self.last.append(record)
+            stats = self.stages.setdefault(record["stage"], {
+                "count": 0, "seconds": 0.0, "max_seconds": 0.0, "errors": 0,
+                "pixels": 0, "bytes": 0})
+            stats["count"] += 1
+            stats["seconds"] += record["seconds"]
+            stats["max_seconds"] = max(stats["max_seconds"], record["seconds"])
+            stats["errors"] += "error" in record
+            stats["pixels"] += record.get("pixels", 0)
+            stats["bytes"] += record.get("bytes", 0)
+            if line:
+                with open(self.log_path, "a", encoding="utf-8") as f:
+                    f.write(line + "\n")
+
+    def count(self, name, value=1, **labels):
+        if not self.enabled:
+            return
+        key = (name, tuple(sorted(labels.items())))
+        with self.lock:
+            self.counters[key] = self.counters.get(key, 0) + value
+
+    def summary(self):
+        # "open 12 ms · embed 40 ms ..." for the last operation
+        with self.lock:
+            return " · ".join(f"{r['stage']} {r['seconds'] * 1000:.0f} ms" for r in self.last)
+
+    def prometheus(self):
+        lines = []
+        with self.lock:
+            stages = sorted(self.stages.items())
+            counters = sorted(self.counters.items())
+        families = [
+            ("stego_stage_seconds", "summary", "Time spent per pipeline stage", None),
+            ("stego_stage_seconds_max", "gauge", "Slowest run of each stage", "max_seconds"),
+            ("stego_stage_errors_total", "counter", "Stage runs that raised", "errors"),
+            ("stego_stage_pixels_total", "counter", "Pixels touched per stage", "pixels"),
+            ("stego_stage_bytes_total", "counter", "Payload bytes handled per stage", "bytes"),
+        ]
+        for name, kind, help_text, field in families:
+            lines += [f"# HELP {name} {help_text}", f"# TYPE {name} {kind}"]
+            for stage, stats in stages:
+                if field is None:
+                    lines.append(f'{name}_sum{{stage="{stage}"}} {stats["seconds"]:.6f}')
+                    lines.append(f'{name}_count{{stage="{stage}"}} {stats["count"]}')
+                else:
+                    lines.append(f'{name}{{stage="{stage}"}} {stats[field]}')
+
+        previous = None
+        for (name, labels), value in counters:
+            if name != previous:
+                lines.append(f"# TYPE stego_{name}_total counter")
+                previous = name
+            label_text = ",".join(f'{k}="{v}"' for k, v in labels)
+            lines.append(f"stego_{name}_total{{{label_text}}} {value}")
+
+        peak = peak_rss_mb()
+        if peak is not None:
+            lines += ["# HELP stego_peak_rss_bytes Peak resident memory of the process",
+                      "# TYPE stego_peak_rss_bytes gauge",
+                      f"stego_peak_rss_bytes {int(peak * (1 << 20))}"]
+        return "\n".join(lines) + "\n"
+
+    def write_prometheus(self, path):
+        temp_path = f"{path}.{os.getpid()}.tmp"
+        with open(temp_path, "w", encoding="utf-8") as f:
+            f.write(self.prometheus())
+        os.replace(temp_path, path)
+
+
+recorder = Recorder()
+
+
+def configure(enabled=True, log_path=None):
+    recorder.configure(enabled, log_path)
+
+
+def span(stage, **attrs):
+    if not recorder.enabled:
+        return NULL_SPAN
+    return Span(recorder, stage, attrs)
+
+
+def count(name, value=1, **labels):
+    recorder.count(name, value, **labels)
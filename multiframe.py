@@ -0,0 +1,221 @@
+# multiframe.py
+# One payload spread over every frame of an animated PNG, GIF or WebP, or over
+# every page of a TIFF. The header sits at the start of the first frame and
+# the body runs on through the frames in order, as if they were one long
+# image (stego.FRAMES_FLAG marks such headers). Frames are decoded, embedded
+# and written one at a time, so memory holds a single frame.
+#
+# Palette frames (GIF, palette PNG or TIFF pages) are expanded to RGB(A) and
+# written that way: re-quantising them to a palette would scramble the low
+# bits. Animations are therefore always written as APNG, TIFFs as TIFF.
+import itertools
+import struct
+import zlib
+from fractions import Fraction
+
+import numpy as np
+from PIL import Image, TiffImagePlugin
+
+import stego
+import streaming
+
+ANIMATED_FORMATS = ("PNG", "GIF", "WEBP")
+FRAME_FORMATS = ANIMATED_FORMATS + ("TIFF",)
+
+
+def is_multiframe(path):
+    try:
+        with Image.open(path) as image:
+            return image.format in FRAME_FORMATS and getattr(image, "n_frames", 1) > 1
+    except (OSError, ValueError):
+        return False
+
+
+def output_extension(path):
+    with Image.open(path) as image:
+        return ".tiff" if image.format == "TIFF" else ".png"
+
+
+def frame_mode(frame):
+    return "RGBA" if frame.has_transparency_data else "RGB"
+
+
+def frame_sizes(image):
+    # Animation frames are all composited onto the full canvas; TIFF pages
+    # have their own sizes, read from each page's directory without decoding
+    if image.format != "TIFF":
+        return [image.size] * getattr(image, "n_frames", 1)
+    sizes = []
+    for index in range(image.n_frames):
+        image.seek(index)
+        sizes.append(image.size)
+    image.seek(0)
+    return sizes
+
+
+def read_frames(image):
+    # Yields (pixels, duration in ms) per frame. Animation frames all take
+    # the first frame's mode, as APNG needs one mode throughout; TIFF pages
+    # keep their own.
+    if image.format not in FRAME_FORMATS:
+        raise ValueError(f"{image.format} images have no frames to stream")
+    mode = frame_mode(image) if image.format != "TIFF" else None
+    for index in range(getattr(image, "n_frames", 1)):
+        image.seek(index)
+        frame = image.convert(mode or frame_mode(image))
+        yield np.array(frame, dtype=np.uint8), image.info.get("duration", 0)
+
+
+def frames_layout(sizes, bits_per_channel=1, use_alpha=False, flags=0, length=None):
+    if sizes[0][0] * sizes[0][1] < stego.HEADER_PIXELS[stego.HEADER_VERSION]:
+        raise ValueError("The first frame is too small to hold the header")
+    total = sum(width * height for width, height in sizes)
+    return stego.Layout(total, 1, bits_per_channel, use_alpha, flags, length, frames=True)
+
+
+class APNGFrameWriter(streaming.PNGBandWriter):
+    # Every frame covers the whole canvas and replaces the one before it, so
+    # the file shows exactly the composited frames that were read. The first
+    # frame is the default image (IDAT), later ones are stored in fdAT chunks.
+    def __init__(self, path, width, height, mode, frames, loop=0, compress_level=6):
+        super().__init__(path, width, height, mode, compress_level)
+        self._write_chunk(b"acTL", struct.pack(">II", frames, loop))
+        self.size = (width, height)
+        self.compress_level = compress_level
+        self.sequence = 0
+        self.frame = -1
+
+    def _flush_idat(self, final=False):
+        if self.frame <= 0:
+            super()._flush_idat(final)
+            return
+        while len(self.pending) >= streaming.IDAT_SIZE or (final and self.pending):
+            self._write_chunk(b"fdAT", struct.pack(">I", self.sequence)
+                              + bytes(self.pending[:streaming.IDAT_SIZE]))
+            self.sequence += 1
+            del self.pending[:streaming.IDAT_SIZE]
+
+    def write_frame(self, pixels, duration=0):
+        if self.frame >= 0:
+            self.pending += self.compressor.flush()
+            self._flush_idat(final=True)
+            self.compressor = zlib.compressobj(self.compress_level)
+            self.previous = np.zeros_like(self.previous)
+        self.frame += 1
+
+        delay = Fraction(round(duration or 0), 1000).limit_denominator(65535)
+        numerator, denominator = min(delay.numerator, 65535), delay.denominator
+        # dispose_op NONE, blend_op SOURCE
+        self._write_chunk(b"fcTL", struct.pack(">IIIIIHHBB", self.sequence, *self.size, 0, 0,
+                                               numerator, denominator, 0, 0))
+        self.sequence += 1
+        self.write(pixels)
+
+
+class TIFFFrameWriter(streaming.AtomicBandWriter):
+    # Pages are appended one at a time with Pillow's AppendingTiffWriter
+    def __init__(self, path, compress_level=None):
+        super().__init__(path)
+        self.options = stego.save_options("TIFF", compress_level)
+        self.file = open(self.temp_path, "w+b")
+        self.tiff = TiffImagePlugin.AppendingTiffWriter(self.file)
+
+    def write_frame(self, pixels, duration=0):
+        Image.fromarray(pixels).save(self.tiff, format="TIFF", **self.options)
+        self.tiff.newFrame()
+
+    def close(self):
+        self.tiff.close()
+        self.file.close()
+
+    def abort(self):
+        self.file.close()
+        super().abort()
+
+
+def open_frame_writer(path, image, frames, compress_level=None):
+    if image.format == "TIFF":
+        return TIFFFrameWriter(path, compress_level)
+    level = stego.save_options("PNG", compress_level)["compress_level"]
+    return APNGFrameWriter(path, *image.size, frame_mode(image), frames,
+                           image.info.get("loop", 0), level)
+
+
+def frame_encode(src_path, dst_path, message, bits_per_channel=1, use_alpha=False, flags=0,
+                 compress_level=None, progress=None):
+    return frame_encode_chunks(src_path, dst_path, [bytes(message)], len(message),
+                               bits_per_channel, use_alpha, flags, compress_level, progress)
+
+
+def frame_encode_chunks(src_path, dst_path, chunks, body_size, bits_per_channel=1, use_alpha=False,
+                        flags=0, compress_level=None, progress=None):
+    # Returns the number of pixels in all frames
+    with Image.open(src_path) as image:
+        sizes = frame_sizes(image)
+        layout = frames_layout(sizes, bits_per_channel, use_alpha, flags, body_size)
+        if body_size > layout.body_capacity():
+            raise ValueError("Message too large for image")
+
+        body = stego.BitFeeder(chunks)
+        header_bits = layout.header_bits()
+        end, first_pixel = layout.end_pixel(), 0
+        with open_frame_writer(dst_path, image, len(sizes), compress_level) as writer:
+            for index, (pixels, duration) in enumerate(read_frames(image)):
+                # Frames past the end of the body are copied unchanged
+                if first_pixel < end:
+                    stego.check_bands(pixels, use_alpha)
+                    layout.embed(pixels, first_pixel, body, header_bits)
+                writer.write_frame(pixels, duration)
+                first_pixel += pixels.shape[0] * pixels.shape[1]
+                if progress:
+                    progress(index + 1, len(sizes))
+    return layout.width
+
+
+def frame_open_body(src_path):
+    # Returns (layout, chunks) like streaming.stream_open_body(); chunks stops
+    # decoding frames once the one holding the end of the body is read
+    image = Image.open(src_path)
+    try:
+        sizes = frame_sizes(image)
+        total = sum(width * height for width, height in sizes)
+        frames = read_frames(image)
+        first, _ = next(frames)
+        header = first.reshape(1, -1, first.shape[-1])[:, :stego.HEADER_PIXELS[stego.HEADER_VERSION]]
+        layout = stego.layout_from_lsb(stego.lsb_bytes(header), total, 1)
+        if layout.length is not None and layout.length > layout.body_capacity():
+            raise ValueError("Hidden payload header is corrupted")
+    except Exception:
+        image.close()
+        raise
+
+    def chunks():
+        # Frames rarely hold a whole number of bytes, so leftover bits are
+        # carried into the next frame
+        try:
+            pending = np.zeros(0, dtype=np.uint8)
+            first_pixel, end = 0, layout.end_pixel()
+            for pixels in itertools.chain([first], (pixels for pixels, _ in frames)):
+                skip = max(0, layout.start - first_pixel)
+                count = pixels.shape[0] * pixels.shape[1]
+                if skip < count:
+                    bits = np.concatenate([pending, stego.lsb_bits(pixels, layout.depth,
+                                                                   layout.channels, skip)])
+                    whole = len(bits) - len(bits) % 8
+                    pending = bits[whole:]
+                    yield np.packbits(bits[:whole]).tobytes()
+                first_pixel += count
+                if first_pixel >= end:
+                    break
+        finally:
+            image.close()
+
+    return layout, chunks()
+
+
+def frame_decode_message(src_path):
+    layout, chunks = frame_open_body(src_path)
+    try:
+        return stego.read_payload(chunks, layout), layout
+    finally:
+        chunks.close()
@@ -0,0 +1,154 @@
+# payload.py
+# How the plaintext is prepared before it is embedded. Text messages are
+# optionally compressed and then Fernet-encrypted; the codec id is stored in
+# the low bits of the stego header flags. Files use the CHUNKED format below.
+import base64
+import lzma
+import os
+import struct
+import zlib
+
+from cryptography.fernet import Fernet
+from cryptography.hazmat.primitives import hashes
+from cryptography.hazmat.primitives.ciphers.aead import AESGCM
+from cryptography.hazmat.primitives.kdf.hkdf import HKDF
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+CODEC_MASK = 0x07
+# Header flag for the chunked AEAD stream:
+#   prefix (8 random bytes), then chunks of
+#   length (4 bytes, big-endian, top bit set on the final chunk)
+#   AES-256-GCM ciphertext of `length` bytes plus a 16-byte tag
+# The GCM key is derived from the Fernet key with HKDF-SHA256.
+# Each chunk's nonce is the prefix plus its 4-byte index and its length field
+# is authenticated, so reordered, dropped or truncated chunks fail to decrypt.
+CHUNKED = 0x08
+# Header flag for one shard of a payload spread over several images (see shards.py)
+SHARDED = 0x10
+CHUNK_SIZE = 1 << 16
+FINAL_CHUNK = 0x80000000
+NONCE_PREFIX_SIZE = 8
+TAG_SIZE = 16
+CHUNK_KEY_INFO = b"image-steganography chunked payload AES-256-GCM"
+CODECS = {"none": 0, "zlib": 1, "lzma": 2, "zstd": 3}
+DEFAULT_LEVELS = {"zlib": 9, "lzma": 6, "zstd": 19}
+
+
+def compress(data, codec="zlib", level=None):
+    # Returns (flags, data); falls back to uncompressed when compressing
+    # would not make the payload smaller
+    if codec not in CODECS:
+        raise ValueError(f"Unknown compression codec {codec!r}")
+    if codec == "none" or not data:
+        return 0, data
+
+    level = DEFAULT_LEVELS[codec] if level is None else level
+    if codec == "zlib":
+        compressed = zlib.compress(data, level)
+    elif codec == "lzma":
+        compressed = lzma.compress(data, preset=level)
+    else:
+        if zstandard is None:
+            raise ValueError("zstd compression needs the zstandard package")
+        compressed = zstandard.ZstdCompressor(level=level).compress(data)
+
+    if len(compressed) >= len(data):
+        return 0, data
+    return CODECS[codec], compressed
+
+
+def decompress(flags, data):
+    codec = flags & CODEC_MASK
+    if codec == 0:
+        return data
+    if codec == CODECS["zlib"]:
+        return zlib.decompress(data)
+    if codec == CODECS["lzma"]:
+        return lzma.decompress(data)
+    if codec == CODECS["zstd"]:
+        if zstandard is None:
+            raise ValueError("This message is zstd-compressed; install the zstandard package")
+        return zstandard.ZstdDecompressor().decompress(data)
+    raise ValueError(f"Unknown compression codec id {codec}")
+
+
+def seal(message, key, codec="zlib", level=None):
+    # Text payloads: compressed when it helps, then Fernet-encrypted.
+    # Returns (flags, token)
+    flags, data = compress(message, codec, level)
+    return flags, Fernet(key).encrypt(data)
+
+
+def unseal(token, key, flags):
+    return decompress(flags, Fernet(key).decrypt(token))
+
+
+def chunk_cipher(key):
+    # Keys are the same urlsafe-base64 keys Fernet generates. Fernet uses those
+    # 32 bytes as its own HMAC and AES-CBC keys, so the AES-256-GCM key is
+    # derived from them rather than reused.
+    hkdf = HKDF(algorithm=hashes.SHA256(), length=32, salt=None, info=CHUNK_KEY_INFO)
+    return AESGCM(hkdf.derive(base64.urlsafe_b64decode(key)))
+
+
+def chunked_size(size, chunk_size=CHUNK_SIZE):
+    chunks = max(1, -(-size // chunk_size))
+    return NONCE_PREFIX_SIZE + size + chunks * (4 + TAG_SIZE)
+
+
+def encrypt_chunks(key, fileobj, chunk_size=CHUNK_SIZE):
+    # Yields the encrypted stream one chunk at a time
+    cipher = chunk_cipher(key)
+    prefix = os.urandom(NONCE_PREFIX_SIZE)
+    yield prefix
+
+    index = 0
+    current = fileobj.read(chunk_size)
+    while True:
+        following = fileobj.read(chunk_size) if len(current) == chunk_size else b""
+        length = struct.pack(">I", len(current) | (0 if following else FINAL_CHUNK))
+        yield length + cipher.encrypt(prefix + struct.pack(">I", index), current, length)
+        if not following:
+            return
+        index += 1
+        current = following
+
+
+def decrypt_chunks(key, read, max_chunk_size=1 << 24):
+    # read(n) must return exactly n bytes (e.g. stego.BodyReader.read);
+    # yields the plaintext one chunk at a time
+    cipher = chunk_cipher(key)
+    prefix = read(NONCE_PREFIX_SIZE)
+
+    index = 0
+    while True:
+        length = read(4)
+        value = struct.unpack(">I", length)[0]
+        size = value & ~FINAL_CHUNK
+        if size > max_chunk_size:
+            raise ValueError("Corrupted payload")
+        yield cipher.decrypt(prefix + struct.pack(">I", index), read(size + TAG_SIZE), length)
+        if value & FINAL_CHUNK:
+            return
+        index += 1
+
+
+def write_chunks_atomic(path, chunks):
+    # A failed or cancelled decrypt leaves no partial file behind
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    temp_path = f"{path}.{os.getpid()}.tmp"
+    size = 0
+    try:
+        with open(temp_path, "wb") as f:
+            for chunk in chunks:
+                f.write(chunk)
+                size += len(chunk)
+        os.replace(temp_path, path)
+    finally:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+    return size
@@ -0,0 +1,193 @@
+# preview_cache.py
+# Thumbnails for the preview canvas: decoded at reduced resolution, kept in a
+# memory-bounded LRU and optionally mirrored to disk across runs
+import hashlib
+import os
+import threading
+from collections import OrderedDict
+
+from PIL import Image
+
+PREVIEW_SIZE = 450
+
+
+def preview_size(width, height, size=PREVIEW_SIZE):
+    # Same aspect-ratio rule the preview has always used
+    aspect_ratio = width / height
+    if aspect_ratio > 1:
+        return size, max(1, int(size / aspect_ratio))
+    return max(1, int(size * aspect_ratio)), size
+
+
+def make_thumbnail(image, size=PREVIEW_SIZE):
+    new_size = preview_size(image.width, image.height, size)
+    if image.mode not in ("RGB", "RGBA", "L"):
+        image = image.convert("RGBA" if "A" in image.getbands() else "RGB")
+    # reducing_gap lets PIL shrink by an integer factor first (reduce() or
+    # JPEG DCT scaling) before the LANCZOS pass over a much smaller image
+    return image.resize(new_size, Image.Resampling.LANCZOS, reducing_gap=3.0)
+
+
+def load_thumbnail(path, size=PREVIEW_SIZE):
+    with Image.open(path) as image:
+        if image.format == "JPEG":
+            image.draft("RGB", preview_size(image.width, image.height, size))
+        return make_thumbnail(image, size)
+
+
+def cache_key(path):
+    stat = os.stat(path)
+    return os.path.abspath(path), stat.st_mtime_ns, stat.st_size
+
+
+class CacheEntry:
+    def __init__(self, thumbnail):
+        self.thumbnail = thumbnail
+        self.rendered = None
+        # The thumbnail plus the rendered copy (Tk keeps its own pixel buffer)
+        self.nbytes = 2 * thumbnail.width * thumbnail.height * len(thumbnail.getbands())
+
+
+class PreviewCache:
+    def __init__(self, max_bytes=64 << 20, disk_dir=None, max_disk_bytes=256 << 20,
+                 size=PREVIEW_SIZE):
+        self.max_bytes = max_bytes
+        self.disk_dir = disk_dir
+        self.max_disk_bytes = max_disk_bytes
+        self.size = size
+        self.entries = OrderedDict()
+        self.nbytes = 0
+        self.hits = self.misses = 0
+        self.lock = threading.Lock()
+        if disk_dir:
+            os.makedirs(disk_dir, exist_ok=True)
+
+    def get(self, path, render=None):
+        # Returns the rendered thumbnail (or the PIL thumbnail without a
+        # render function). render runs on the calling thread, so Tk objects
+        # are only ever created by the Tk thread
+        key = cache_key(path)
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry:
+                self.entries.move_to_end(key)
+                self.hits += 1
+        if entry is None:
+            self.misses += 1
+            thumbnail = self._load_from_disk(key)
+            if thumbnail is None:
+                thumbnail = load_thumbnail(path, self.size)
+                self._save_to_disk(key, thumbnail)
+            entry = self._insert(key, thumbnail)
+
+        if render is None:
+            return entry.thumbnail
+        if entry.rendered is None:
+            entry.rendered = render(entry.thumbnail)
+        return entry.rendered
+
+    def put(self, path, image):
+        # Seeds the cache from pixels already in memory, e.g. an image that
+        # was just saved, so previewing it doesn't decode the file again
+        key = cache_key(path)
+        thumbnail = make_thumbnail(image, self.size)
+        self._save_to_disk(key, thumbnail)
+        self._insert(key, thumbnail)
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+            self.nbytes = 0
+
+    def _insert(self, key, thumbnail):
+        entry = CacheEntry(thumbnail)
+        with self.lock:
+            old = self.entries.pop(key, None)
+            if old:
+                self.nbytes -= old.nbytes
+            self.entries[key] = entry
+            self.nbytes += entry.nbytes
+            while self.nbytes > self.max_bytes and len(self.entries) > 1:
+                _, evicted = self.entries.popitem(last=False)
+                self.nbytes -= evicted.nbytes
+        return entry
+
+    def _disk_path(self, key):
+        digest = hashlib.sha1(repr((key, self.size)).encode()).hexdigest()
+        return os.path.join(self.disk_dir, f"{digest}.png")
+
+    def _load_from_disk(self, key):
+        if not self.disk_dir:
+            return None
+        path = self._disk_path(key)
+        try:
+            with Image.open(path) as image:
+                image.load()
+                os.utime(path)
+                return image
+        except (OSError, ValueError):
+            return None
+
+    def _save_to_disk(self, key, thumbnail):
+        if not self.disk_dir:
+            return
+        path = self._disk_path(key)
+        temp_path = f"{path}.{threading.get_ident()}.tmp"
+        try:
+            thumbnail.save(temp_path, format="PNG", compress_level=1)
+            os.replace(temp_path, path)
+        except OSError:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+            return
+        self._prune_disk()
+
+    def _prune_disk(self):
+        # Least recently used files go first; loads touch their mtime
+        files = []
+        for entry in os.scandir(self.disk_dir):
+            if entry.name.endswith(".png"):
+                try:
+                    stat = entry.stat()
+                except OSError:
+                    continue
+                files.append((stat.st_mtime, stat.st_size, entry.path))
+        total = sum(size for _, size, _ in files)
+        for _, size, full in sorted(files):
+            if total <= self.max_disk_bytes:
+                break
+            try:
+                os.remove(full)
+            except OSError:
+                pass
+            total -= size
+
+
+def load_resized_asset(path, size, cache_dir=None):
+    # Fixed-size UI artwork, resized once and reused while the source file's
+    # contents are unchanged
+    if not cache_dir:
+        with Image.open(path) as image:
+            return image.resize(size, Image.Resampling.LANCZOS)
+
+    with open(path, "rb") as f:
+        digest = hashlib.sha256(f.read()).hexdigest()
+    cached_path = os.path.join(cache_dir, f"{digest[:32]}_{size[0]}x{size[1]}.png")
+    try:
+        with Image.open(cached_path) as image:
+            image.load()
+            return image
+    except (OSError, ValueError):
+        pass
+
+    with Image.open(path) as image:
+        resized = image.resize(size, Image.Resampling.LANCZOS)
+    os.makedirs(cache_dir, exist_ok=True)
+    temp_path = f"{cached_path}.{os.getpid()}.tmp"
+    try:
+        resized.save(temp_path, format="PNG")
+        os.replace(temp_path, cached_path)
+    except OSError:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+    return resized
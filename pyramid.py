@@ -0,0 +1,240 @@
+# pyramid.py
+# Zoom and pan for the preview canvas. Level 0 of an ImagePyramid is the
+# full-resolution image and level n is it reduced 2**n times; levels are built
+# on first use from the nearest finer one. The canvas only renders the tiles
+# it can see, and recently drawn tiles are kept in a memory-bounded LRU, so
+# panning around a 100 MP cover never resizes the whole image again.
+import math
+import threading
+from collections import OrderedDict, namedtuple
+
+from PIL import Image
+
+TILE_SIZE = 256
+# Canvas pixels per image pixel at the closest zoom
+MAX_ZOOM = 32
+ZOOM_STEP = 1.25
+
+# Pixels [0, start) hold the header and [start, end) the payload body
+PayloadRegion = namedtuple("PayloadRegion", "start end")
+Tile = namedtuple("Tile", "key box size position")
+
+
+class Viewport:
+    # The part of a width x height image shown on a view_width x view_height
+    # canvas: `zoom` canvas pixels per image pixel, (x, y) the image point at
+    # the canvas's top-left corner
+    def __init__(self, width, height, view_width, view_height):
+        self.width, self.height = width, height
+        self.view_width, self.view_height = view_width, view_height
+        self.fit()
+
+    def fit_zoom(self):
+        return min(self.view_width / self.width, self.view_height / self.height)
+
+    def min_zoom(self):
+        return min(self.fit_zoom(), MAX_ZOOM)
+
+    @property
+    def fitted(self):
+        return math.isclose(self.zoom, self.min_zoom())
+
+    def fit(self):
+        self.zoom = self.min_zoom()
+        self.x = self.y = 0.0
+        self.clamp()
+
+    def zoom_at(self, factor, canvas_x, canvas_y):
+        # Keeps the image point under (canvas_x, canvas_y) where it is
+        zoom = min(MAX_ZOOM, max(self.min_zoom(), self.zoom * factor))
+        image_x = self.x + canvas_x / self.zoom
+        image_y = self.y + canvas_y / self.zoom
+        self.zoom = zoom
+        self.x = image_x - canvas_x / zoom
+        self.y = image_y - canvas_y / zoom
+        self.clamp()
+
+    def pan(self, dx, dy):
+        self.x -= dx / self.zoom
+        self.y -= dy / self.zoom
+        self.clamp()
+
+    def clamp(self):
+        # An image smaller than the canvas is centred, a larger one can't be
+        # dragged past its edges
+        for axis, size, view in (("x", self.width, self.view_width),
+                                 ("y", self.height, self.view_height)):
+            span = view / self.zoom
+            if span >= size:
+                setattr(self, axis, (size - span) / 2)
+            else:
+                setattr(self, axis, min(max(getattr(self, axis), 0.0), size - span))
+
+    def visible(self):
+        # Image box (left, top, right, bottom) on screen
+        return (max(0.0, self.x), max(0.0, self.y),
+                min(self.width, self.x + self.view_width / self.zoom),
+                min(self.height, self.y + self.view_height / self.zoom))
+
+    def to_canvas(self, image_x, image_y):
+        return (image_x - self.x) * self.zoom, (image_y - self.y) * self.zoom
+
+
+def preview_mode(image):
+    # Modes Tk can show directly
+    if image.mode in ("RGB", "RGBA", "L"):
+        return image
+    return image.convert("RGBA" if "A" in image.getbands() else "RGB")
+
+
+def load_source(path):
+    with Image.open(path) as image:
+        image.load()
+        return preview_mode(image)
+
+
+class ImagePyramid:
+    # image: pixels already in memory, shared rather than decoded again.
+    # thumbnail: a small version to draw from until the file is decoded.
+    def __init__(self, path, image=None, thumbnail=None):
+        self.path = path
+        self.thumbnail = thumbnail
+        self.levels = {}
+        # Set by the viewer while the file is decoded / its payload looked up
+        self.loading = False
+        self.finding_region = False
+        self.region = None
+        self.region_checked = False
+        if image is not None:
+            self.width, self.height = image.size
+            self.levels[0] = preview_mode(image)
+        else:
+            with Image.open(path) as opened:
+                self.width, self.height = opened.size
+
+    @property
+    def loaded(self):
+        return 0 in self.levels
+
+    def set_source(self, image):
+        self.levels = {0: image}
+
+    def max_level(self):
+        return max(0, int(math.log2(max(self.width, self.height))))
+
+    def level_number(self, zoom):
+        # The coarsest level that still has at least one pixel per canvas pixel
+        if zoom >= 1:
+            return 0
+        return min(self.max_level(), int(math.log2(1 / zoom)))
+
+    def level(self, number):
+        image = self.levels.get(number)
+        if image is None:
+            finer = max(n for n in self.levels if n < number)
+            image = self.levels[finer].reduce(1 << (number - finer))
+            self.levels[number] = image
+        return image
+
+    def best_level(self, zoom):
+        # (number, image) to draw at zoom; number is None when only the
+        # thumbnail is available, which is then stretched as a placeholder
+        if self.loaded:
+            number = self.level_number(zoom)
+            return number, self.level(number)
+        return None, self.thumbnail
+
+    def tiles(self, viewport, number, image):
+        # Tiles of a level image covering the viewport. Tile edges are placed
+        # in zoomed-image space, so neighbours meet exactly and a tile keeps
+        # its size (and cache entry) while the view is panned.
+        fx = viewport.zoom * self.width / image.width
+        fy = viewport.zoom * self.height / image.height
+        edge = max(16, int(TILE_SIZE / max(fx, fy)))
+        left, top, right, bottom = viewport.visible()
+        origin_x, origin_y = round(viewport.x * viewport.zoom), round(viewport.y * viewport.zoom)
+
+        tiles = []
+        level_right = min(image.width, math.ceil(right * image.width / self.width))
+        level_bottom = min(image.height, math.ceil(bottom * image.height / self.height))
+        for ty in range(int(top * image.height / self.height) // edge, -(-level_bottom // edge)):
+            y0, y1 = ty * edge, min(image.height, (ty + 1) * edge)
+            top_px, bottom_px = math.floor(y0 * fy), math.floor(y1 * fy)
+            for tx in range(int(left * image.width / self.width) // edge, -(-level_right // edge)):
+                x0, x1 = tx * edge, min(image.width, (tx + 1) * edge)
+                left_px, right_px = math.floor(x0 * fx), math.floor(x1 * fx)
+                size = (max(1, right_px - left_px), max(1, bottom_px - top_px))
+                tiles.append(Tile((id(self), number, round(viewport.zoom, 6), edge, tx, ty),
+                                  (x0, y0, x1, y1), size, (left_px - origin_x, top_px - origin_y)))
+        return tiles
+
+    def render_tile(self, number, image, tile):
+        # Whole image pixels are shown as crisp blocks once zoomed past 1:1
+        resample = Image.Resampling.NEAREST if number == 0 else Image.Resampling.BILINEAR
+        return image.crop(tile.box).resize(tile.size, resample)
+
+
+class TileCache:
+    # Rendered tiles by key, least recently drawn evicted first. render runs on
+    # the calling thread so Tk images are only created by the Tk thread.
+    def __init__(self, max_bytes=96 << 20):
+        self.max_bytes = max_bytes
+        self.entries = OrderedDict()
+        self.nbytes = 0
+        self.hits = self.misses = 0
+        self.lock = threading.Lock()
+
+    def get(self, key, make, render):
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry:
+                self.entries.move_to_end(key)
+                self.hits += 1
+                return entry[0]
+        self.misses += 1
+        tile = make()
+        rendered = render(tile)
+        nbytes = tile.width * tile.height * 4
+        with self.lock:
+            self.entries[key] = (rendered, nbytes)
+            self.nbytes += nbytes
+            while self.nbytes > self.max_bytes and len(self.entries) > 1:
+                _, (_, evicted) = self.entries.popitem(last=False)
+                self.nbytes -= evicted
+        return rendered
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+            self.nbytes = 0
+
+
+def payload_region(path):
+    # Pixels the hidden payload occupies, or None for images without one.
+    # streaming (and with it numpy) is only imported once the overlay is first
+    # asked for, keeping it out of the GUI's startup.
+    import streaming
+
+    found = streaming.inspect_file(path)
+    if found is None:
+        return None
+    layout, length = found
+    return PayloadRegion(layout.start, layout.pixels_touched(length))
+
+
+def region_rects(first, last, width):
+    # Image boxes covering pixels [first, last) in row-major order: the rest
+    # of the first row, the full rows, then the start of the last row
+    rects = []
+    row, column = divmod(first, width)
+    end_row, end_column = divmod(last, width)
+    if row == end_row:
+        return [(column, row, end_column, row + 1)] if end_column > column else []
+    if column:
+        rects.append((column, row, width, row + 1))
+        row += 1
+    if end_row > row:
+        rects.append((0, row, width, end_row))
+    if end_column:
+        rects.append((0, end_row, end_column, end_row + 1))
+    return rects
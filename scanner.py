@@ -0,0 +1,231 @@
+# scanner.py
+# Finds which images in a corpus carry hidden payloads and keeps the answers
+# in a SQLite index, so later scans only look at new or changed files
+import argparse
+import hashlib
+import itertools
+import json
+import os
+import sqlite3
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import cli
+import streaming
+
+HASH_CHUNK = 1 << 20
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS images (
+    path TEXT PRIMARY KEY,
+    size INTEGER NOT NULL,
+    mtime_ns INTEGER NOT NULL,
+    sha256 TEXT,
+    carrier INTEGER,
+    payload_size INTEGER,
+    version INTEGER,
+    flags INTEGER,
+    error TEXT,
+    scanned REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS images_carrier ON images (carrier);
+CREATE INDEX IF NOT EXISTS images_sha256 ON images (sha256);
+"""
+COLUMNS = ("path", "size", "mtime_ns", "sha256", "carrier", "payload_size", "version", "flags",
+           "error", "scanned")
+
+
+def file_hash(path):
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        while chunk := f.read(HASH_CHUNK):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def inspect_image(path):
+    # Returns (version, payload_size, flags) for a carrier, else None
+    found = streaming.inspect_file(path)
+    if found is None:
+        return None
+    layout, length = found
+    return layout.version, length, layout.flags
+
+
+def scan_file(path, size, mtime_ns, previous=None):
+    # Runs in a pool process. previous is the file's old index row: a file
+    # that was only touched keeps its result without being inspected again.
+    row = {"path": path, "size": size, "mtime_ns": mtime_ns, "sha256": None, "carrier": None,
+           "payload_size": None, "version": None, "flags": None, "error": None,
+           "scanned": time.time()}
+    try:
+        row["sha256"] = file_hash(path)
+        if previous and previous["sha256"] == row["sha256"] and previous["error"] is None:
+            row.update({k: previous[k] for k in ("carrier", "payload_size", "version", "flags")})
+            return row
+        found = inspect_image(path)
+        row["carrier"] = int(found is not None)
+        if found:
+            row["version"], row["payload_size"], row["flags"] = found
+    except Exception as e:
+        row["error"] = str(e) or type(e).__name__
+    return row
+
+
+class ScanIndex:
+    def __init__(self, path):
+        self.path = path
+        self.db = sqlite3.connect(path)
+        self.db.row_factory = sqlite3.Row
+        self.db.execute("PRAGMA journal_mode=WAL")
+        self.db.executescript(SCHEMA)
+
+    def close(self):
+        self.db.close()
+
+    def stats(self):
+        # (size, mtime_ns) of every indexed path
+        return {row["path"]: (row["size"], row["mtime_ns"])
+                for row in self.db.execute("SELECT path, size, mtime_ns FROM images")}
+
+    def get(self, path):
+        row = self.db.execute("SELECT * FROM images WHERE path = ?", (path,)).fetchone()
+        return dict(row) if row else None
+
+    def upsert(self, rows):
+        with self.db:
+            self.db.executemany(
+                f"INSERT OR REPLACE INTO images ({', '.join(COLUMNS)}) "
+                f"VALUES ({', '.join(':' + c for c in COLUMNS)})", rows)
+
+    def remove(self, paths):
+        with self.db:
+            self.db.executemany("DELETE FROM images WHERE path = ?", [(p,) for p in paths])
+
+    def query(self, carriers_only=True, under=None, version=None, min_size=None):
+        sql, params = "SELECT * FROM images WHERE 1", []
+        if carriers_only:
+            sql += " AND carrier = 1"
+        if under:
+            sql += " AND path LIKE ? ESCAPE '\\'"
+            prefix = os.path.join(os.path.abspath(under), "")
+            params.append(prefix.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_") + "%")
+        if version is not None:
+            sql += " AND version = ?"
+            params.append(version)
+        if min_size is not None:
+            sql += " AND payload_size >= ?"
+            params.append(min_size)
+        return [dict(row) for row in self.db.execute(sql + " ORDER BY path", params)]
+
+    def summary(self):
+        row = self.db.execute(
+            "SELECT COUNT(*) AS files, SUM(carrier = 1) AS carriers, "
+            "SUM(error IS NOT NULL) AS errors FROM images").fetchone()
+        return {k: row[k] or 0 for k in ("files", "carriers", "errors")}
+
+
+def scan(index, roots, workers=None, rescan=False, batch_size=500, progress=None):
+    # Returns (inspected, unchanged, removed) counts
+    indexed = index.stats()
+    seen, pending = set(), []
+    for path, _ in cli.expand_inputs(roots):
+        path = os.path.abspath(path)
+        try:
+            stat = os.stat(path)
+        except OSError:
+            continue
+        seen.add(path)
+        if rescan or indexed.get(path) != (stat.st_size, stat.st_mtime_ns):
+            previous = None if rescan or path not in indexed else index.get(path)
+            pending.append((path, stat.st_size, stat.st_mtime_ns, previous))
+
+    # Rows under the scanned roots whose files are gone
+    files = {os.path.abspath(root) for root in roots}
+    prefixes = tuple(os.path.join(root, "") for root in files if os.path.isdir(root))
+    removed = [path for path in indexed
+               if path not in seen and (path in files or path.startswith(prefixes))]
+    index.remove(removed)
+
+    if workers == 1:
+        executor = None
+        results = itertools.starmap(scan_file, pending)
+    else:
+        executor = ProcessPoolExecutor(max_workers=workers)
+        results = executor.map(scan_file, *zip(*pending), chunksize=32) if pending else []
+
+    done, batch = 0, []
+    try:
+        for row in results:
+            batch.append(row)
+            done += 1
+            # Results are committed in batches so an interrupted scan keeps
+            # most of its work
+            if len(batch) >= batch_size:
+                index.upsert(batch)
+                batch = []
+            if progress:
+                progress(done, len(pending), row)
+        index.upsert(batch)
+    finally:
+        if executor:
+            executor.shutdown(cancel_futures=True)
+    return len(pending), len(seen) - len(pending), len(removed)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Index which images carry hidden payloads")
+    parser.add_argument("--index", default="stego_index.sqlite",
+                        help="SQLite index file (default: stego_index.sqlite)")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    scan_parser = subparsers.add_parser("scan", help="Scan directories, files or glob patterns")
+    scan_parser.add_argument("inputs", nargs="+", help="Image files, glob patterns or directories")
+    scan_parser.add_argument("--workers", type=int, default=os.cpu_count() or 1,
+                             help="Number of worker processes (default: CPU count)")
+    scan_parser.add_argument("--rescan", action="store_true",
+                             help="Inspect every file again, even if unchanged")
+    scan_parser.add_argument("--quiet", action="store_true", help="Only print the summary")
+
+    list_parser = subparsers.add_parser("list", help="List indexed carriers")
+    list_parser.add_argument("--all", action="store_true", help="Include images without a payload")
+    list_parser.add_argument("--under", help="Only paths under this directory")
+    list_parser.add_argument("--version", type=int, help="Only this header version (0 = legacy)")
+    list_parser.add_argument("--min-size", type=int, help="Only payloads of at least this many bytes")
+    list_parser.add_argument("--json", action="store_true", help="One JSON object per line")
+
+    subparsers.add_parser("stats", help="Print index totals")
+    args = parser.parse_args(argv)
+
+    index = ScanIndex(args.index)
+    try:
+        if args.command == "scan":
+            def report(done, total, row):
+                if not args.quiet and (row["carrier"] or row["error"]):
+                    detail = row["error"] or f"v{row['version']} {row['payload_size']} bytes"
+                    print(f"{'carrier' if row['carrier'] else 'error':<8} {row['path']}  {detail}")
+
+            started = time.perf_counter()
+            inspected, unchanged, removed = scan(index, args.inputs, max(1, args.workers),
+                                                 args.rescan, progress=report)
+            print(f"{inspected} inspected, {unchanged} unchanged, {removed} removed "
+                  f"in {time.perf_counter() - started:.2f}s", file=sys.stderr)
+        elif args.command == "list":
+            for row in index.query(not args.all, args.under, args.version, args.min_size):
+                if args.json:
+                    print(json.dumps(row))
+                else:
+                    state = "carrier" if row["carrier"] else ("error" if row["error"] else "-")
+                    size = row["payload_size"] if row["payload_size"] is not None else ""
+                    print(f"{state:<8} v{row['version'] if row['version'] is not None else '-'} "
+                          f"{size:>10}  {row['path']}")
+        else:
+            print(json.dumps(index.summary()))
+    finally:
+        index.close()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,321 @@
+# server.py
+# Local HTTP service for embed/extract. Uploads are spooled to disk as they
+# arrive, the LSB work runs in a bounded process pool and results are streamed
+# back from disk, so no request holds a whole image in the event loop.
+#
+#   POST /embed?bits=1&alpha=0&compress=zlib&level=
+#       X-Payload-Length: N   first N body bytes are the message, the rest is the cover
+#       X-Key: <fernet key>   optional; a generated key is returned in X-Key
+#       -> image/png
+#   POST /extract   X-Key: <fernet key>, body is the stego image
+#       -> the message (text/plain) or a hidden file (application/octet-stream)
+#   GET /health, GET /metrics
+import argparse
+import asyncio
+import json
+import multiprocessing
+import os
+import shutil
+import sys
+import tempfile
+import time
+import traceback
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from http import HTTPStatus
+from urllib.parse import parse_qs, urlsplit
+
+import cli
+import payload
+import stego
+import streaming
+
+READ_CHUNK = 1 << 16
+MAX_HEADER_BYTES = 16 << 10
+
+
+class HTTPError(Exception):
+    def __init__(self, status, message=None, headers=None):
+        super().__init__(message or HTTPStatus(status).phrase)
+        self.status = status
+        self.headers = headers or {}
+
+
+class StageStats:
+    # Latency counters per pipeline stage, reported by /metrics
+    def __init__(self):
+        self.stages = {}
+        self.responses = {}
+
+    def add(self, stage, seconds):
+        stats = self.stages.setdefault(stage, {"count": 0, "seconds": 0.0, "max_seconds": 0.0})
+        stats["count"] += 1
+        stats["seconds"] += seconds
+        stats["max_seconds"] = max(stats["max_seconds"], seconds)
+
+    def response(self, status):
+        self.responses[status] = self.responses.get(status, 0) + 1
+
+    def snapshot(self):
+        stages = {}
+        for stage, stats in self.stages.items():
+            stages[stage] = dict(stats, mean_seconds=stats["seconds"] / stats["count"])
+        return {"stages": stages, "responses": {str(k): v for k, v in self.responses.items()}}
+
+
+def embed_job(cover_path, output, message, key, bits_per_channel, use_alpha, compression, level):
+    # Runs in a pool process; PNG and PPM covers are processed in row bands
+    return cli.embed_file(cover_path, output, message, key, streaming.can_stream(cover_path),
+                          bits_per_channel, use_alpha, compression, level)
+
+
+def extract_job(path, output, key):
+    return cli.extract_file(path, output, key, streaming.can_stream(path))
+
+
+class StegoServer:
+    def __init__(self, host="127.0.0.1", port=8765, workers=None, max_in_flight=None,
+                 max_body_bytes=256 << 20, retry_after=1, spool_dir=None, header_timeout=10):
+        self.host, self.port = host, port
+        self.workers = workers or os.cpu_count() or 1
+        self.max_in_flight = max_in_flight or self.workers * 2
+        self.max_body_bytes = max_body_bytes
+        self.retry_after = retry_after
+        self.spool_dir = spool_dir
+        self.header_timeout = header_timeout
+        self.in_flight = 0
+        self.stats = StageStats()
+        self.started = time.time()
+        self.executor = None
+        self.server = None
+
+    def new_executor(self):
+        # Spawned rather than forked: a forked worker would inherit the open
+        # client and listening sockets and keep connections from closing
+        return ProcessPoolExecutor(max_workers=self.workers,
+                                   mp_context=multiprocessing.get_context("spawn"))
+
+    async def start(self):
+        self.executor = self.new_executor()
+        self.server = await asyncio.start_server(self.handle, self.host, self.port)
+        self.port = self.server.sockets[0].getsockname()[1]
+        return self
+
+    async def close(self):
+        self.server.close()
+        await self.server.wait_closed()
+        self.executor.shutdown(wait=True, cancel_futures=True)
+
+    async def handle(self, reader, writer):
+        try:
+            try:
+                method, target, headers = await asyncio.wait_for(
+                    self.read_head(reader), self.header_timeout)
+                await self.dispatch(method, target, headers, reader, writer)
+            except HTTPError as e:
+                await self.send_json(writer, e.status, {"error": str(e)}, e.headers)
+        except (asyncio.TimeoutError, asyncio.IncompleteReadError, ConnectionError):
+            pass
+        except Exception:
+            traceback.print_exc()
+            try:
+                await self.send_json(writer, 500, {"error": "Internal server error"})
+            except ConnectionError:
+                pass
+        finally:
+            writer.close()
+
+    async def read_head(self, reader):
+        try:
+            head = await reader.readuntil(b"\r\n\r\n")
+        except asyncio.LimitOverrunError:
+            raise HTTPError(431)
+        if len(head) > MAX_HEADER_BYTES:
+            raise HTTPError(431)
+        lines = head.decode("latin-1").split("\r\n")
+        try:
+            method, target, _ = lines[0].split(" ", 2)
+        except ValueError:
+            raise HTTPError(400, "Malformed request line")
+        headers = {}
+        for line in lines[1:]:
+            if ":" in line:
+                name, value = line.split(":", 1)
+                headers[name.strip().lower()] = value.strip()
+        return method, target, headers
+
+    async def dispatch(self, method, target, headers, reader, writer):
+        url = urlsplit(target)
+        routes = {"/embed": ("POST", self.embed), "/extract": ("POST", self.extract),
+                  "/health": ("GET", self.health), "/metrics": ("GET", self.metrics)}
+        if url.path not in routes:
+            raise HTTPError(404)
+        allowed, handler = routes[url.path]
+        if method != allowed:
+            raise HTTPError(405, headers={"Allow": allowed})
+        query = {name: values[-1] for name, values in parse_qs(url.query).items()}
+
+        if method == "GET":
+            await handler(writer)
+            return
+
+        # Excess load is turned away before the upload is read
+        if self.in_flight >= self.max_in_flight:
+            raise HTTPError(503, "Server busy", {"Retry-After": str(self.retry_after)})
+        self.in_flight += 1
+        workdir = tempfile.mkdtemp(prefix="stego-", dir=self.spool_dir)
+        try:
+            await handler(query, headers, reader, writer, workdir)
+        finally:
+            self.in_flight -= 1
+            shutil.rmtree(workdir, ignore_errors=True)
+
+    def body_length(self, headers):
+        if "chunked" in headers.get("transfer-encoding", "").lower():
+            raise HTTPError(411, "Chunked uploads are not supported; send Content-Length")
+        try:
+            length = int(headers["content-length"])
+        except (KeyError, ValueError):
+            raise HTTPError(411)
+        if length > self.max_body_bytes:
+            raise HTTPError(413, f"Body exceeds {self.max_body_bytes} bytes")
+        return length
+
+    async def spool(self, reader, length, path):
+        # Copies the next `length` body bytes to path without buffering them
+        started = time.perf_counter()
+        with open(path, "wb") as f:
+            while length:
+                chunk = await reader.read(min(READ_CHUNK, length))
+                if not chunk:
+                    raise asyncio.IncompleteReadError(b"", length)
+                f.write(chunk)
+                length -= len(chunk)
+        self.stats.add("receive", time.perf_counter() - started)
+
+    async def run_job(self, stage, func, *args):
+        started = time.perf_counter()
+        try:
+            result = await asyncio.get_running_loop().run_in_executor(self.executor, func, *args)
+        except BrokenProcessPool:
+            # A worker died (killed for memory, say); later requests get a new pool
+            self.executor.shutdown(wait=False)
+            self.executor = self.new_executor()
+            raise
+        elapsed = time.perf_counter() - started
+        # Time spent waiting for a free worker is reported separately
+        self.stats.add("queue", max(0.0, elapsed - result["seconds"]))
+        self.stats.add(stage, result["seconds"])
+        if result["status"] != "ok":
+            raise HTTPError(422, result["error"])
+        return result
+
+    async def embed(self, query, headers, reader, writer, workdir):
+        length = self.body_length(headers)
+        try:
+            payload_length = int(headers.get("x-payload-length", ""))
+        except ValueError:
+            raise HTTPError(400, "X-Payload-Length header is required")
+        if not 0 < payload_length < length:
+            raise HTTPError(400, "X-Payload-Length must be between 1 and the body length - 1")
+        try:
+            bits = int(query.get("bits", 1))
+            level = int(query["level"]) if query.get("level") else None
+        except ValueError:
+            raise HTTPError(400, "bits and level must be integers")
+        if not 1 <= bits <= stego.MAX_BITS_PER_CHANNEL:
+            raise HTTPError(400, f"bits must be between 1 and {stego.MAX_BITS_PER_CHANNEL}")
+        compression = query.get("compress", "zlib")
+        if compression not in payload.CODECS:
+            raise HTTPError(400, f"compress must be one of {', '.join(sorted(payload.CODECS))}")
+        use_alpha = query.get("alpha", "0").lower() in ("1", "true", "yes")
+
+        message = await reader.readexactly(payload_length)
+        cover = os.path.join(workdir, "cover")
+        await self.spool(reader, length - payload_length, cover)
+
+        output = os.path.join(workdir, "encoded.png")
+        result = await self.run_job("embed", embed_job, cover, output, message,
+                                    headers.get("x-key"), bits, use_alpha, compression, level)
+        extra = {"X-Key": result["key"]} if "key" in result else {}
+        await self.send_file(writer, output, "image/png", extra)
+
+    async def extract(self, query, headers, reader, writer, workdir):
+        length = self.body_length(headers)
+        if not headers.get("x-key"):
+            raise HTTPError(400, "X-Key header is required")
+        image = os.path.join(workdir, "image")
+        await self.spool(reader, length, image)
+
+        result = await self.run_job("extract", extract_job, image,
+                                    os.path.join(workdir, "message.txt"), headers["x-key"])
+        # Text messages come back as UTF-8, hidden files as raw bytes
+        content_type = ("text/plain; charset=utf-8" if "message" in result
+                        else "application/octet-stream")
+        await self.send_file(writer, result["output"], content_type)
+
+    async def health(self, writer):
+        await self.send_json(writer, 200, {
+            "status": "ok", "workers": self.workers, "in_flight": self.in_flight,
+            "max_in_flight": self.max_in_flight, "uptime": round(time.time() - self.started, 3)})
+
+    async def metrics(self, writer):
+        await self.send_json(writer, 200, dict(self.stats.snapshot(), in_flight=self.in_flight))
+
+    async def send_head(self, writer, status, content_type, length, headers=None):
+        self.stats.response(status)
+        lines = [f"HTTP/1.1 {status} {HTTPStatus(status).phrase}",
+                 f"Content-Type: {content_type}", f"Content-Length: {length}",
+                 "Connection: close"]
+        lines += [f"{name}: {value}" for name, value in (headers or {}).items()]
+        writer.write(("\r\n".join(lines) + "\r\n\r\n").encode("latin-1"))
+
+    async def send_json(self, writer, status, body, headers=None):
+        data = json.dumps(body).encode()
+        await self.send_head(writer, status, "application/json", len(data), headers)
+        writer.write(data)
+        await writer.drain()
+
+    async def send_file(self, writer, path, content_type, headers=None):
+        started = time.perf_counter()
+        await self.send_head(writer, 200, content_type, os.path.getsize(path), headers)
+        with open(path, "rb") as f:
+            while chunk := f.read(READ_CHUNK):
+                writer.write(chunk)
+                await writer.drain()
+        self.stats.add("send", time.perf_counter() - started)
+
+
+async def serve(args):
+    server = await StegoServer(args.host, args.port, args.workers, args.max_in_flight,
+                               args.max_body_mb << 20, args.retry_after, args.spool_dir).start()
+    print(f"Serving on http://{args.host}:{server.port} with {server.workers} workers",
+          file=sys.stderr)
+    try:
+        await server.server.serve_forever()
+    finally:
+        await server.close()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Local HTTP service for embed/extract")
+    parser.add_argument("--host", default="127.0.0.1", help="Address to bind (default: 127.0.0.1)")
+    parser.add_argument("--port", type=int, default=8765, help="Port to bind (default: 8765)")
+    parser.add_argument("--workers", type=int, help="Worker processes (default: CPU count)")
+    parser.add_argument("--max-in-flight", type=int,
+                        help="Requests admitted at once before answering 503 (default: 2 x workers)")
+    parser.add_argument("--max-body-mb", type=int, default=256,
+                        help="Largest accepted upload in MB (default: 256)")
+    parser.add_argument("--retry-after", type=int, default=1,
+                        help="Retry-After seconds sent with 503 responses (default: 1)")
+    parser.add_argument("--spool-dir", help="Directory for in-progress uploads (default: system temp)")
+    args = parser.parse_args(argv)
+    try:
+        asyncio.run(serve(args))
+    except KeyboardInterrupt:
+        pass
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,253 @@
+# shards.py
+# One payload spread over several covers. The encrypted body is split in
+# proportion to each cover's capacity; every shard starts with
+#   payload id (8 random bytes), index, count (2 bytes each), total size (8 bytes)
+# and is embedded with payload.SHARDED added to the header flags. Shards are
+# embedded and extracted in parallel and reassembled in index order, so the
+# images can be given in any order.
+import os
+import struct
+import tempfile
+import time
+
+from cryptography.fernet import Fernet
+from PIL import Image
+
+import cli
+import payload
+import stego
+
+SHARD_FORMAT = ">8sHHQ"
+SHARD_HEADER_SIZE = struct.calcsize(SHARD_FORMAT)
+MAX_SHARDS = 0xFFFF
+READ_CHUNK = 1 << 20
+
+
+def cover_capacity(path, bits_per_channel=1, use_alpha=False):
+    # Bytes of payload a cover can take as a shard; only the file header is read
+    with Image.open(path) as image:
+        width, height = image.size
+    layout = stego.Layout(width, height, bits_per_channel, use_alpha, length=0)
+    return max(0, layout.body_capacity() - SHARD_HEADER_SIZE)
+
+
+def plan_shards(capacities, total):
+    # Shard sizes proportional to capacity, so every cover is filled to the
+    # same fraction and the parallel embeds take similar time per pixel
+    available = sum(capacities)
+    if total > available:
+        raise ValueError(f"Payload needs {total} bytes but the covers hold {available}")
+    sizes = [total * capacity // available if available else 0 for capacity in capacities]
+    for i, capacity in enumerate(capacities):
+        extra = min(total - sum(sizes), capacity - sizes[i])
+        sizes[i] += extra
+    return sizes
+
+
+def spool_shards(chunks, sizes, payload_id, total, directory):
+    # Writes each shard (prefix and its slice of the body) to its own file
+    paths = []
+    chunks = iter(chunks)
+    pending = memoryview(b"")
+    for index, size in enumerate(sizes):
+        path = os.path.join(directory, f"shard{index}")
+        with open(path, "wb") as f:
+            f.write(struct.pack(SHARD_FORMAT, payload_id, index, len(sizes), total))
+            while size:
+                if not pending:
+                    chunk = next(chunks, None)
+                    if chunk is None:
+                        raise ValueError("Payload ended before all shards were filled")
+                    pending = memoryview(chunk)
+                part = pending[:size]
+                f.write(part)
+                size -= len(part)
+                pending = pending[len(part):]
+        paths.append(path)
+    return paths
+
+
+def embed_shard(cover, output, shard_path, index, flags, stream=False, bits_per_channel=1,
+                use_alpha=False, format="PNG", compress_level=None):
+    # Runs in a pool process
+    started = time.perf_counter()
+    result = {"command": "embed", "input": cover, "output": output, "shard": index}
+    try:
+        size = os.path.getsize(shard_path)
+        with open(shard_path, "rb") as f:
+            pixels = cli.embed_body(cover, output, iter(lambda: f.read(READ_CHUNK), b""), size,
+                                    flags | payload.SHARDED, stream, bits_per_channel, use_alpha,
+                                    format, compress_level)
+        result.update(status="ok", pixels=pixels, bytes=size)
+    except Exception as e:
+        result.update(status="error", error=str(e) or type(e).__name__)
+    result["seconds"] = round(time.perf_counter() - started, 6)
+    return result
+
+
+def extract_shard(path, fragment_path, stream=False):
+    # Runs in a pool process; the shard's slice of the body goes to fragment_path
+    started = time.perf_counter()
+    result = {"command": "extract", "input": path}
+    chunks = None
+    try:
+        pixels, layout, chunks = cli.open_body_chunks(path, stream)
+        if not layout.flags & payload.SHARDED or layout.terminated:
+            raise ValueError("Image does not carry a shard")
+        reader = stego.BodyReader(chunks)
+        payload_id, index, count, total = struct.unpack(SHARD_FORMAT, reader.read(SHARD_HEADER_SIZE))
+        remaining = layout.length - SHARD_HEADER_SIZE
+        with open(fragment_path, "wb") as f:
+            while remaining:
+                part = reader.read(min(READ_CHUNK, remaining))
+                f.write(part)
+                remaining -= len(part)
+        result.update(status="ok", pixels=pixels, bytes=layout.length, payload_id=payload_id.hex(),
+                      shard=index, count=count, total=total,
+                      flags=layout.flags & ~payload.SHARDED, fragment=fragment_path)
+    except Exception as e:
+        result.update(status="error", error=str(e) or type(e).__name__)
+    finally:
+        if chunks is not None:
+            chunks.close()
+    result["seconds"] = round(time.perf_counter() - started, 6)
+    return result
+
+
+def check_shards(shards):
+    # Returns the shards in index order, or raises if they don't make up
+    # exactly one complete payload
+    if not shards:
+        raise ValueError("No shards found")
+    ids = sorted({shard["payload_id"] for shard in shards})
+    if len(ids) > 1:
+        raise ValueError(f"Images belong to {len(ids)} different payloads ({', '.join(ids)})")
+
+    by_index = {}
+    for shard in shards:
+        by_index.setdefault(shard["shard"], []).append(shard)
+    duplicates = [f"{index + 1} ({', '.join(s['input'] for s in found)})"
+                  for index, found in sorted(by_index.items()) if len(found) > 1]
+    if duplicates:
+        raise ValueError(f"Duplicate shards: {'; '.join(duplicates)}")
+
+    count = shards[0]["count"]
+    missing = [str(index + 1) for index in range(count) if index not in by_index]
+    if missing:
+        raise ValueError(f"Missing shards {', '.join(missing)} of {count}")
+
+    ordered = [by_index[index][0] for index in range(count)]
+    if sum(shard["bytes"] - SHARD_HEADER_SIZE for shard in ordered) != ordered[0]["total"]:
+        raise ValueError("Shard sizes do not add up to the payload size")
+    return ordered
+
+
+def read_fragments(shards):
+    for shard in shards:
+        with open(shard["fragment"], "rb") as f:
+            while chunk := f.read(READ_CHUNK):
+                yield chunk
+
+
+def embed_album(covers, outputs, message, key=None, payload_path=None, compression="none",
+                level=None, bits_per_channel=1, use_alpha=False, stream=False, format="PNG",
+                compress_level=None, workers=1, on_result=None):
+    # Spreads one payload over covers (written to outputs) and returns a
+    # summary record; on_result is called with each shard's result
+    started = time.perf_counter()
+    album = {"command": "embed-shards", "inputs": len(covers)}
+    try:
+        if not 1 <= len(covers) <= MAX_SHARDS:
+            raise ValueError(f"Sharding needs between 1 and {MAX_SHARDS} covers")
+        generated = key is None
+        if generated:
+            key = Fernet.generate_key().decode()
+
+        with tempfile.TemporaryDirectory(prefix="stego-shards-") as workdir:
+            if payload_path:
+                flags = payload.CHUNKED
+                total = payload.chunked_size(os.path.getsize(payload_path))
+                payload_file = open(payload_path, "rb")
+                chunks = payload.encrypt_chunks(key, payload_file)
+            else:
+                flags, token = payload.seal(message, key, compression, level)
+                total, payload_file, chunks = len(token), None, [token]
+            try:
+                capacities = [cover_capacity(cover, bits_per_channel, use_alpha) for cover in covers]
+                sizes = plan_shards(capacities, total)
+                payload_id = os.urandom(8)
+                shard_paths = spool_shards(chunks, sizes, payload_id, total, workdir)
+            finally:
+                if payload_file:
+                    payload_file.close()
+
+            jobs = [(embed_shard, cover, output, shard_path, index, flags, stream,
+                     bits_per_channel, use_alpha, format, compress_level)
+                    for index, (cover, output, shard_path)
+                    in enumerate(zip(covers, outputs, shard_paths))]
+            results = []
+
+            def collect(result):
+                results.append(result)
+                if on_result:
+                    on_result(result)
+
+            cli.run_jobs(jobs, workers, collect)
+
+        failed = [result for result in results if result["status"] != "ok"]
+        if failed:
+            raise ValueError(f"{len(failed)} of {len(covers)} shards failed to embed")
+        album.update(status="ok", payload_id=payload_id.hex(), bytes=total, shards=len(covers))
+        if generated:
+            album["key"] = key
+    except Exception as e:
+        album.update(status="error", error=str(e) or type(e).__name__)
+    album["seconds"] = round(time.perf_counter() - started, 6)
+    return album
+
+
+def extract_album(paths, key, out_dir=None, stream=False, workers=1, on_result=None):
+    # Reassembles the payload spread over paths (in any order). Messages are
+    # returned in the summary (and written to <payload id>.txt under out_dir);
+    # hidden files need out_dir and are written to <payload id>.bin.
+    started = time.perf_counter()
+    album = {"command": "extract-shards", "inputs": len(paths)}
+    try:
+        with tempfile.TemporaryDirectory(prefix="stego-shards-") as workdir:
+            jobs = [(extract_shard, path, os.path.join(workdir, f"fragment{i}"), stream)
+                    for i, path in enumerate(paths)]
+            results = []
+
+            def collect(result):
+                results.append(result)
+                if on_result:
+                    on_result(result)
+
+            cli.run_jobs(jobs, workers, collect)
+            failed = [result for result in results if result["status"] != "ok"]
+            if failed:
+                raise ValueError(f"{len(failed)} of {len(paths)} images could not be read as shards")
+
+            shards = check_shards(results)
+            flags, payload_id = shards[0]["flags"], shards[0]["payload_id"]
+            album.update(payload_id=payload_id, shards=len(shards))
+            if flags & payload.CHUNKED:
+                if not out_dir:
+                    raise ValueError("This payload is a file; use --out-dir to extract it")
+                output = os.path.join(out_dir, f"{payload_id}.bin")
+                reader = stego.BodyReader(read_fragments(shards))
+                size = payload.write_chunks_atomic(output, payload.decrypt_chunks(key, reader.read))
+                album.update(output=output, bytes=size)
+            else:
+                token = b"".join(read_fragments(shards))
+                message = payload.unseal(token, key, flags).decode()
+                if out_dir:
+                    output = os.path.join(out_dir, f"{payload_id}.txt")
+                    payload.write_chunks_atomic(output, [message.encode()])
+                    album["output"] = output
+                album.update(message=message, bytes=len(token))
+        album["status"] = "ok"
+    except Exception as e:
+        album.update(status="error", error=str(e) or type(e).__name__)
+    album["seconds"] = round(time.perf_counter() - started, 6)
+    return album
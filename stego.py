@@ -0,0 +1,559 @@
+# stego.py
+import itertools
+import os
+import struct
+import zlib
+from collections import deque, namedtuple
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+from PIL import Image
+
+# '1111111111111110' ended every message before the header recorded its length
+TERMINATOR = b"\xff\xfe"
+# Fernet tokens start with version byte 0x80 and a timestamp whose high bytes
+# are zero, so every header-less (legacy) payload begins with these bytes
+FERNET_PREFIX = b"gAAAAA"
+
+# Header stored in the first pixels, always one bit in each of R, G and B so
+# it can be read before the density is known:
+#   magic, version, density (bits per channel | ALPHA_FLAG | FRAMES_FLAG), flags, reserved,
+#   payload length (4 bytes, big-endian), CRC-32 of the above (low 2 bytes)
+# Version 1 headers (the first 6 bytes, 16 pixels) and header-less legacy
+# images end the payload with TERMINATOR instead. Legacy images start with a
+# Fernet token, which is ASCII and can never begin with the magic.
+HEADER_MAGIC = b"\x89S"
+HEADER_VERSION = 2
+HEADER_FORMAT = ">2sBBBBIH"
+HEADER_SIZE = struct.calcsize(HEADER_FORMAT)
+V1_HEADER_SIZE = 6
+# Header pixels are a multiple of 8 so the body starts byte-aligned in every
+# band of 8 rows, whatever the density
+HEADER_PIXELS = {0: 0, 1: 16, 2: -(-HEADER_SIZE * 8 // 24) * 8}
+ALPHA_FLAG = 0x10
+# The body continues through the image's later frames (see multiframe.py)
+FRAMES_FLAG = 0x20
+MAX_BITS_PER_CHANNEL = 4
+
+# Lossless formats an encoded image can be saved as, with their extensions
+OUTPUT_FORMATS = {"PNG": ".png", "WEBP": ".webp", "TIFF": ".tiff", "BMP": ".bmp"}
+DEFAULT_COMPRESS_LEVEL = 6
+
+CapacityPlan = namedtuple("CapacityPlan", "max_payload pixels_touched fits header")
+PayloadInfo = namedtuple("PayloadInfo", "version length flags bits_per_channel use_alpha")
+
+
+class BitFeeder:
+    # Hands out the bits of a stream of byte chunks in order, unpacking only
+    # as many bytes as the caller has asked for so far (a large chunk is not
+    # expanded to eight times its size in one go)
+    def __init__(self, chunks):
+        self.chunks = iter(chunks)
+        self.chunk = memoryview(b"")
+        self.pending = np.zeros(0, dtype=np.uint8)
+
+    def take(self, count):
+        parts, available = [self.pending], len(self.pending)
+        while available < count:
+            if not self.chunk:
+                chunk = next(self.chunks, None)
+                if chunk is None:
+                    break
+                self.chunk = memoryview(chunk).cast("B")
+                continue
+            size = -(-(count - available) // 8)
+            bits = np.unpackbits(np.frombuffer(self.chunk[:size], dtype=np.uint8))
+            self.chunk = self.chunk[size:]
+            parts.append(bits)
+            available += len(bits)
+        bits = np.concatenate(parts) if len(parts) > 1 else self.pending
+        self.pending = bits[count:]
+        return bits[:count]
+
+
+class BodyReader:
+    # File-like read(n) over a stream of packed body chunks
+    def __init__(self, chunks):
+        self.chunks = iter(chunks)
+        self.buffer = bytearray()
+        self.offset = 0
+
+    def read(self, size):
+        while len(self.buffer) - self.offset < size:
+            chunk = next(self.chunks, None)
+            if chunk is None:
+                raise ValueError("Hidden payload is truncated")
+            self.buffer += chunk
+        data = bytes(self.buffer[self.offset:self.offset + size])
+        self.offset += size
+        # Drop consumed bytes only once they make up half the buffer
+        if self.offset * 2 > len(self.buffer):
+            del self.buffer[:self.offset]
+            self.offset = 0
+        return data
+
+
+def embed_bits(band, bits, depth=1, channels=3, skip=0):
+    # Writes bits into the low `depth` bits of the first `channels` channels
+    # of a (rows, width, bands) array in row-major order, starting `skip`
+    # pixels in. Each slot takes the next `depth` bits, most significant first.
+    if depth > 1:
+        padded = np.zeros(-(-len(bits) // depth) * depth, dtype=np.uint8)
+        padded[:len(bits)] = bits
+        weights = (1 << np.arange(depth - 1, -1, -1)).astype(np.uint8)
+        values = padded.reshape(-1, depth) @ weights
+    else:
+        values = bits
+    count = len(values)
+    touched_pixels = -(-count // channels)
+    pixels = band.reshape(-1, band.shape[-1])[skip:]
+    slots = pixels[:touched_pixels, :channels].reshape(-1)
+    slots[:count] = (slots[:count] & (0xFF << depth & 0xFF)) | values
+    pixels[:touched_pixels, :channels] = slots.reshape(touched_pixels, channels)
+
+
+def lsb_bits(band, depth=1, channels=3, skip=0):
+    # Low bits of a band from pixel `skip` on, one bit per array element
+    values = band.reshape(-1, band.shape[-1])[skip:, :channels].reshape(-1) & ((1 << depth) - 1)
+    if depth > 1:
+        shifts = np.arange(depth - 1, -1, -1, dtype=np.uint8)
+        values = ((values[:, None] >> shifts) & 1).reshape(-1)
+    return values
+
+
+def lsb_bytes(band, depth=1, channels=3, skip=0):
+    # Packed low bits of a band from pixel `skip` on; bits that do not fill a
+    # byte are dropped
+    values = lsb_bits(band, depth, channels, skip)
+    return np.packbits(values[:len(values) - len(values) % 8]).tobytes()
+
+
+def find_message(chunks):
+    data = bytearray()
+    for chunk in chunks:
+        # The terminator always starts on a byte boundary, so the packed
+        # stream is searched directly; keep one byte of overlap between chunks
+        start = max(0, len(data) - 1)
+        data += chunk
+        end = data.find(TERMINATOR, start)
+        if end != -1:
+            return bytes(data[:end])
+
+    raise ValueError("No hidden message found")
+
+
+class Layout:
+    # Where the bit stream lives in a width x height cover: the header in
+    # pixels [0, start) and the body from `start` on, `depth` bits in each of
+    # `channels` channels per pixel. The body is `length` bytes, or ends with
+    # TERMINATOR when length is None (version 0 and 1 images).
+    def __init__(self, width, height, bits_per_channel=1, use_alpha=False, flags=0, length=None,
+                 version=HEADER_VERSION, frames=False):
+        if not 1 <= bits_per_channel <= MAX_BITS_PER_CHANNEL:
+            raise ValueError(f"Bits per channel must be between 1 and {MAX_BITS_PER_CHANNEL}")
+        self.width, self.height = width, height
+        self.depth = bits_per_channel
+        self.use_alpha = use_alpha
+        self.channels = 4 if use_alpha else 3
+        self.flags = flags
+        self.length = length
+        self.version = version
+        self.frames = frames
+        self.header = version > 0
+        self.start = HEADER_PIXELS[version]
+
+    @property
+    def bits_per_pixel(self):
+        return self.depth * self.channels
+
+    def header_fits(self):
+        return self.start <= self.width * self.height
+
+    def body_capacity(self):
+        return max(0, (self.width * self.height - self.start) * self.bits_per_pixel // 8)
+
+    @property
+    def terminated(self):
+        return self.version < 2
+
+    def max_payload(self):
+        return max(0, self.body_capacity() - (len(TERMINATOR) if self.terminated else 0))
+
+    def pixels_for_body(self, body_size):
+        return self.start + -(-body_size * 8 // self.bits_per_pixel)
+
+    def pixels_touched(self, payload_size):
+        return self.pixels_for_body(payload_size + (len(TERMINATOR) if self.terminated else 0))
+
+    def end_pixel(self):
+        # Pixels that have to be read to recover the body
+        if self.length is None:
+            return self.width * self.height
+        return min(self.width * self.height, self.pixels_for_body(self.length))
+
+    def header_bytes(self):
+        density = (self.depth | (ALPHA_FLAG if self.use_alpha else 0)
+                   | (FRAMES_FLAG if self.frames else 0))
+        fields = struct.pack(HEADER_FORMAT[:-1], HEADER_MAGIC, self.version, density, self.flags, 0,
+                             self.length)
+        return fields + struct.pack(">H", zlib.crc32(fields) & 0xFFFF)
+
+    def header_bits(self):
+        if not self.header:
+            return None
+        return np.unpackbits(np.frombuffer(self.header_bytes(), dtype=np.uint8))
+
+    def embed(self, band, first_pixel, body, header_bits=None):
+        # band holds the pixels [first_pixel, first_pixel + band pixels);
+        # bands must be passed in order as body (a BitFeeder) is consumed
+        band_pixels = band.shape[0] * band.shape[1]
+        if header_bits is not None and first_pixel < self.start:
+            segment = header_bits[first_pixel * 3:(first_pixel + band_pixels) * 3]
+            embed_bits(band, segment, 1, 3)
+
+        skip = max(0, self.start - first_pixel)
+        if skip < band_pixels:
+            bits = body.take((band_pixels - skip) * self.bits_per_pixel)
+            if len(bits):
+                embed_bits(band, bits, self.depth, self.channels, skip)
+
+    def body_bytes(self, band, first_pixel):
+        # Packed body bits carried by a band
+        band_pixels = band.shape[0] * band.shape[1]
+        if first_pixel + band_pixels <= self.start:
+            return b""
+        return lsb_bytes(band, self.depth, self.channels, skip=max(0, self.start - first_pixel))
+
+
+def parse_header(data, width, height):
+    # Returns the Layout described by a header, or None for legacy images.
+    # A magic whose checksum does not match, or that is followed by an
+    # unknown version, is taken as chance cover data.
+    if len(data) < V1_HEADER_SIZE or data[:len(HEADER_MAGIC)] != HEADER_MAGIC:
+        return None
+    version, density, flags = data[2], data[3], data[4]
+    length = None
+    if version == HEADER_VERSION:
+        if len(data) < HEADER_SIZE:
+            return None
+        *_, length, check = struct.unpack(HEADER_FORMAT, data[:HEADER_SIZE])
+        if zlib.crc32(data[:HEADER_SIZE - 2]) & 0xFFFF != check:
+            return None
+    elif version != 1:
+        return None
+    if not 1 <= density & 0x0F <= MAX_BITS_PER_CHANNEL:
+        return None
+    layout = Layout(width, height, density & 0x0F, bool(density & ALPHA_FLAG), flags, length, version,
+                    bool(density & FRAMES_FLAG))
+    # A body running on through later frames is checked against all of them
+    # by multiframe.py
+    if length is not None and not layout.frames and length > layout.body_capacity():
+        raise ValueError("Hidden payload header is corrupted")
+    return layout
+
+
+def layout_from_lsb(data, width, height):
+    # Layout for an image whose first low bits (one per R, G, B) are data
+    return parse_header(data[:HEADER_SIZE], width, height) or Layout(width, height, version=0)
+
+
+def pixel_array(buffer, size=None, mode="RGB"):
+    # (height, width, bands) uint8 view of an ndarray, or of a raw bytes,
+    # bytearray or memoryview buffer holding `size` pixels in `mode`; the
+    # pixels are never copied
+    if isinstance(buffer, np.ndarray):
+        array = buffer
+    else:
+        if size is None:
+            raise ValueError("Raw pixel buffers need the image size")
+        width, height = size
+        array = np.frombuffer(buffer, dtype=np.uint8)
+        if len(array) != width * height * Image.getmodebands(mode):
+            raise ValueError(f"Buffer does not hold a {width}x{height} {mode} image")
+        array = array.reshape(height, width, Image.getmodebands(mode))
+    if array.dtype != np.uint8 or array.ndim != 3:
+        raise ValueError("Pixel arrays must be uint8 with shape (height, width, bands)")
+    return array
+
+
+def image_size(image):
+    # Engine functions take either a PIL image or a pixel_array()
+    if isinstance(image, np.ndarray):
+        return image.shape[1], image.shape[0]
+    return image.size
+
+
+def read_rows(image, top, bottom):
+    # Rows [top, bottom) as an array; a view for arrays, a copy for PIL images
+    if isinstance(image, np.ndarray):
+        return image[top:bottom]
+    return np.asarray(image.crop((0, top, image.width, bottom)), dtype=np.uint8)
+
+
+def check_bands(image, use_alpha=False):
+    if isinstance(image, np.ndarray):
+        bands = ("R", "G", "B", "A")[:image.shape[2]] if image.shape[2] <= 4 else ()
+    else:
+        bands = image.getbands()
+    if len(bands) < 3:
+        raise ValueError("Image must have at least 3 colour channels")
+    if use_alpha and bands[3:4] != ("A",):
+        raise ValueError("Alpha embedding needs an RGBA image")
+
+
+def plan_capacity(image, payload_size, bits_per_channel=1, use_alpha=False, flags=0):
+    layout = Layout(*image_size(image), bits_per_channel, use_alpha, flags)
+    max_payload = layout.max_payload()
+    return CapacityPlan(max_payload, layout.pixels_touched(payload_size),
+                        layout.header_fits() and payload_size <= max_payload, layout.header)
+
+
+def map_bands(func, bands, threads=1):
+    # Yields func(*band) for each argument tuple in bands, in order. With more
+    # than one thread the calls run on a pool, at most 2 * threads at a time;
+    # numpy releases the GIL for the bit operations, so bands of one image
+    # are processed in parallel. Closing the generator cancels queued bands.
+    if threads <= 1:
+        for band in bands:
+            yield func(*band)
+        return
+    with ThreadPoolExecutor(max_workers=threads) as executor:
+        pending = deque()
+        try:
+            for band in bands:
+                pending.append(executor.submit(func, *band))
+                if len(pending) >= 2 * threads:
+                    yield pending.popleft().result()
+            while pending:
+                yield pending.popleft().result()
+        finally:
+            for future in pending:
+                future.cancel()
+
+
+def embed_band(image, layout, top, bottom, body, header_bits):
+    # Embeds the body bytes carried by rows [top, bottom); returns the band
+    # for PIL images, which the caller pastes back, and None for arrays,
+    # which are changed in place
+    first_pixel = top * layout.width
+    if isinstance(image, np.ndarray):
+        band = image[top:bottom]
+        # Strided views (e.g. a crop of a larger frame) are embedded in a
+        # contiguous copy of the band and written back
+        work = band if band.flags.c_contiguous else np.ascontiguousarray(band)
+        layout.embed(work, first_pixel, BitFeeder([body]), header_bits)
+        if work is not band:
+            band[...] = work
+        return None
+    band = np.array(image.crop((0, top, layout.width, bottom)), dtype=np.uint8)
+    layout.embed(band, first_pixel, BitFeeder([body]), header_bits)
+    return band
+
+
+def encode_lsb(image, message, progress=None, band_rows=256, bits_per_channel=1, use_alpha=False,
+               flags=0, threads=1):
+    encode_stream(image, [bytes(message)], len(message), progress, band_rows, bits_per_channel,
+                  use_alpha, flags, threads)
+
+
+def encode_stream(image, chunks, body_size, progress=None, band_rows=256, bits_per_channel=1,
+                  use_alpha=False, flags=0, threads=1):
+    # Embeds body_size bytes produced by the chunks iterable; chunks are only
+    # pulled as the bands that carry them are reached
+    width, height = image_size(image)
+    check_bands(image, use_alpha)
+    layout = Layout(width, height, bits_per_channel, use_alpha, flags, body_size)
+
+    if not layout.header_fits():
+        raise ValueError("Image is too small to hold the header")
+    if body_size > layout.body_capacity():
+        raise ValueError("Message too large for image")
+
+    reader = BodyReader(chunks)
+    header_bits = layout.header_bits()
+
+    # Only the rows that will carry bits are pulled out of the image. Bands
+    # are a multiple of 8 rows and the header a multiple of 8 pixels, so each
+    # band's share of the body starts on a byte boundary and can be sliced
+    # off up front; bands are then independent of each other.
+    rows = -(-layout.pixels_for_body(body_size) // width)
+    band_rows = -(-max(1, band_rows) // 8) * 8
+
+    def bands():
+        remaining = body_size
+        for top in range(0, rows, band_rows):
+            bottom = min(rows, top + band_rows)
+            body_pixels = max(0, bottom * width - max(top * width, layout.start))
+            size = min(remaining, body_pixels * layout.bits_per_pixel // 8)
+            remaining -= size
+            yield image, layout, top, bottom, reader.read(size), header_bits
+
+    # Results come back in band order, so PIL bands are pasted and progress
+    # reported in order. Arrays are changed in place.
+    for top, band in zip(range(0, rows, band_rows), map_bands(embed_band, bands(), threads)):
+        bottom = min(rows, top + band_rows)
+        if band is not None:
+            image.paste(Image.frombytes(image.mode, (width, bottom - top), band.tobytes()), (0, top))
+        if progress:
+            progress(bottom, rows)
+
+
+def read_layout(image):
+    # Reads only the header pixels
+    width, height = image_size(image)
+    check_bands(image)
+    rows = min(height, -(-HEADER_PIXELS[HEADER_VERSION] // width))
+    return layout_from_lsb(lsb_bytes(read_rows(image, 0, rows)), width, height)
+
+
+def probe(buffer, size=None, mode="RGB"):
+    # PayloadInfo for an image carrying a headed payload, else None. Legacy
+    # terminator-only images are not detected (that needs a full scan).
+    image = buffer if isinstance(buffer, Image.Image) else pixel_array(buffer, size, mode)
+    layout = read_layout(image)
+    if not layout.header:
+        return None
+    return PayloadInfo(layout.version, layout.length, layout.flags, layout.depth, layout.use_alpha)
+
+
+def band_bytes(image, layout, top, bottom):
+    # (bottom, packed body bytes of rows [top, bottom))
+    return bottom, layout.body_bytes(read_rows(image, top, bottom), top * layout.width)
+
+
+def iter_lsb_bytes(image, layout=None, band_rows=8, max_band_rows=1024, progress=None, threads=1):
+    width, height = image_size(image)
+    check_bands(image)
+    layout = layout or Layout(width, height, version=0)
+
+    # Bands are a multiple of 8 rows so every band packs into whole bytes;
+    # they start small so short messages are found without touching the rest.
+    # When the header gives the length, no rows past the body are read.
+    rows = -(-layout.end_pixel() // width)
+    band_rows, max_band_rows = (-(-max(1, n) // 8) * 8 for n in (band_rows, max_band_rows))
+
+    def bands():
+        top, size = 0, band_rows
+        while top < rows:
+            yield image, layout, top, min(rows, top + size)
+            top += size
+            # With threads, bands stay at max_band_rows so the pool has work
+            size = max_band_rows if threads > 1 else min(size * 2, max_band_rows)
+
+    for bottom, data in map_bands(band_bytes, bands(), threads):
+        yield data
+        if progress:
+            progress(bottom, rows)
+
+
+def open_body(image, progress=None, threads=1):
+    # Returns (layout, reader) for payloads that delimit themselves instead
+    # of using the terminator (see payload.CHUNKED)
+    layout = read_layout(image)
+    return layout, BodyReader(iter_lsb_bytes(image, layout, progress=progress, threads=threads))
+
+
+def find_payload(layout, chunks):
+    # Length of the payload carried by the body chunks, or None for an image
+    # without one. Headed payloads give it without reading the body; legacy
+    # ones are read up to their terminator, and only if they start like a
+    # Fernet token. Closes chunks.
+    try:
+        if layout.header and not layout.terminated:
+            return layout.length
+        first = next(chunks, b"")
+        if not layout.header and not first.startswith(FERNET_PREFIX):
+            return None
+        try:
+            return len(find_message(itertools.chain([first], chunks)))
+        except ValueError:
+            return None
+    finally:
+        chunks.close()
+
+
+def read_payload(chunks, layout):
+    # Exactly layout.length bytes when the header records the length, else
+    # everything up to the terminator
+    if layout.terminated:
+        return find_message(chunks)
+    return BodyReader(chunks).read(layout.length)
+
+
+def decode_message(image, progress=None, threads=1, band_rows=1024):
+    # Returns (message, layout); layout.flags tells the caller how the
+    # message was prepared (see payload.py)
+    layout = read_layout(image)
+    chunks = iter_lsb_bytes(image, layout, max_band_rows=band_rows, progress=progress,
+                            threads=threads)
+    try:
+        return read_payload(chunks, layout), layout
+    finally:
+        chunks.close()
+
+
+def decode_lsb(image, progress=None, threads=1):
+    return decode_message(image, progress, threads)[0]
+
+
+def embed(buffer, payload, size=None, mode="RGB", progress=None, bits_per_channel=1,
+          use_alpha=False, flags=0, threads=1, band_rows=256):
+    # Hides payload in a PIL image, a (height, width, bands) uint8 array or a
+    # raw pixel buffer (see pixel_array). Images, arrays and writable buffers
+    # are changed in place; bytes are copied once into a bytearray. Returns
+    # the object holding the result. threads > 1 embeds bands of band_rows
+    # rows concurrently; the result is the same bit for bit.
+    if isinstance(buffer, bytes):
+        buffer = bytearray(buffer)
+    target = buffer if isinstance(buffer, Image.Image) else pixel_array(buffer, size, mode)
+    if isinstance(target, np.ndarray) and not target.flags.writeable:
+        raise ValueError("Pixel buffer is read-only")
+    encode_lsb(target, payload, progress, band_rows, bits_per_channel, use_alpha, flags, threads)
+    return buffer
+
+
+def extract(buffer, size=None, mode="RGB", progress=None, threads=1, band_rows=1024):
+    # Counterpart of embed(); use decode_message() on the same image or
+    # pixel_array() to also get the header flags
+    target = buffer if isinstance(buffer, Image.Image) else pixel_array(buffer, size, mode)
+    return decode_message(target, progress, threads, band_rows)[0]
+
+
+def save_options(format, compress_level=None, mode="RGB"):
+    # Encoder settings for OUTPUT_FORMATS; compress_level runs from 0 (fastest,
+    # largest) to 9 (slowest, smallest) whatever the format
+    level = DEFAULT_COMPRESS_LEVEL if compress_level is None else compress_level
+    if not 0 <= level <= 9:
+        raise ValueError("Compression level must be between 0 and 9")
+    if format == "PNG":
+        return {"compress_level": level}
+    if format == "WEBP":
+        # exact keeps the RGB values of fully transparent pixels; quality above
+        # 80 costs many times the encode time for a few bytes
+        return {"lossless": True, "exact": True, "quality": level * 80 // 9,
+                "method": level * 6 // 9}
+    if format == "TIFF":
+        return {"compression": "tiff_adobe_deflate" if level else "raw"}
+    if format == "BMP":
+        # Pillow reads 32-bit BMPs back without their alpha channel
+        if mode != "RGB":
+            raise ValueError("BMP output only supports RGB images")
+        return {}
+    raise ValueError(f"Unsupported output format {format!r}; use one of "
+                     f"{', '.join(OUTPUT_FORMATS)}")
+
+
+def save_atomic(image, path, format="PNG", progress=None, compress_level=None):
+    # The image is written next to its target and only renamed into place once
+    # complete; progress may raise to abandon the save before the rename
+    options = save_options(format, compress_level, image.mode)
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    temp_path = f"{path}.{os.getpid()}.tmp"
+    try:
+        image.save(temp_path, format=format, **options)
+        if progress:
+            progress(1, 1)
+        os.replace(temp_path, path)
+    finally:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
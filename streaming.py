@@ -0,0 +1,361 @@
+# streaming.py
+# Band-by-band embed/extract for covers too large to decode in one piece.
+# Readers and writers only ever hold one band of rows in memory.
+import itertools
+import os
+import struct
+import zlib
+
+import numpy as np
+from PIL import Image
+
+import stego
+
+PNG_SIGNATURE = b"\x89PNG\r\n\x1a\n"
+PNG_COLOR_TYPES = {2: "RGB", 6: "RGBA"}
+IDAT_SIZE = 1 << 16
+
+
+class PNGBandReader:
+    def __init__(self, path):
+        self.file = open(path, "rb")
+        if self.file.read(8) != PNG_SIGNATURE:
+            self.file.close()
+            raise ValueError("Not a PNG file")
+
+        chunk_type, data = self._read_chunk()
+        width, height, depth, color_type, _, _, interlace = struct.unpack(">IIBBBBB", data)
+        if chunk_type != b"IHDR" or depth != 8 or color_type not in PNG_COLOR_TYPES or interlace:
+            self.file.close()
+            raise ValueError("Streaming needs a non-interlaced 8-bit RGB or RGBA PNG")
+
+        self.width, self.height = width, height
+        self.mode = PNG_COLOR_TYPES[color_type]
+        self.channels = len(self.mode)
+
+    def _read_chunk(self):
+        length, chunk_type = struct.unpack(">I4s", self.file.read(8))
+        data = self.file.read(length)
+        self.file.read(4)
+        return chunk_type, data
+
+    def _idat(self):
+        # IDAT data is read in pieces, so a PNG written as one huge IDAT chunk
+        # is never held in memory whole
+        while True:
+            length, chunk_type = struct.unpack(">I4s", self.file.read(8))
+            if chunk_type == b"IEND":
+                return
+            if chunk_type != b"IDAT":
+                self.file.seek(length + 4, os.SEEK_CUR)
+                continue
+            while length:
+                data = self.file.read(min(IDAT_SIZE, length))
+                if not data:
+                    raise ValueError("PNG file is truncated")
+                length -= len(data)
+                yield data
+            self.file.read(4)
+
+    def _raw_rows(self):
+        row_bytes = self.width * self.channels + 1
+        decompressor = zlib.decompressobj()
+        pending = bytearray()
+        for data in self._idat():
+            while data:
+                pending += decompressor.decompress(data, IDAT_SIZE * 16)
+                data = decompressor.unconsumed_tail
+                complete = len(pending) // row_bytes * row_bytes
+                for start in range(0, complete, row_bytes):
+                    yield pending[start:start + row_bytes]
+                del pending[:complete]
+
+        pending += decompressor.flush()
+        for start in range(0, len(pending) - row_bytes + 1, row_bytes):
+            yield pending[start:start + row_bytes]
+
+    def bands(self, band_rows):
+        previous = bytes(self.width * self.channels)
+        rows = []
+        for raw in self._raw_rows():
+            rows.append(raw)
+            if len(rows) == band_rows:
+                band = unfilter_band(rows, previous, self.width, self.mode)
+                previous = band[-1].tobytes()
+                rows = []
+                yield band
+        if rows:
+            yield unfilter_band(rows, previous, self.width, self.mode)
+
+    def close(self):
+        self.file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def unfilter_band(rows, previous, width, mode):
+    # Undoes the PNG row filters of a band with Pillow's decoder, so Average and
+    # Paeth rows (which depend on the byte to their left) don't need a Python
+    # loop. The reconstructed row above the band goes first, unfiltered, for
+    # the band's first row to refer to; level 0 zlib only adds framing.
+    data = zlib.compress(b"".join([b"\0", previous, *rows]), 0)
+    band = Image.frombytes(mode, (width, len(rows) + 1), data, "zip", mode)
+    return np.array(band)[1:]
+
+
+class PPMBandReader:
+    def __init__(self, path):
+        with open(path, "rb") as f:
+            header = f.read(512)
+
+        fields, offset = [], 0
+        while len(fields) < 4:
+            while header[offset:offset + 1].isspace():
+                offset += 1
+            if header[offset:offset + 1] == b"#":
+                offset = header.index(b"\n", offset)
+                continue
+            end = offset
+            while end < len(header) and not header[end:end + 1].isspace():
+                end += 1
+            fields.append(header[offset:end])
+            offset = end
+
+        if fields[0] != b"P6" or int(fields[3]) != 255:
+            raise ValueError("Streaming needs an 8-bit binary (P6) PPM")
+
+        self.width, self.height = int(fields[1]), int(fields[2])
+        self.mode = "RGB"
+        self.channels = 3
+        self.pixels = np.memmap(path, dtype=np.uint8, mode="r", offset=offset + 1,
+                                shape=(self.height, self.width, 3))
+
+    def bands(self, band_rows):
+        for top in range(0, self.height, band_rows):
+            yield np.array(self.pixels[top:top + band_rows])
+
+    def close(self):
+        self.pixels = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+class AtomicBandWriter:
+    # Output goes to a temp file that only replaces the target on a clean close
+    def __init__(self, path):
+        self.path = path
+        self.temp_path = f"{path}.{os.getpid()}.tmp"
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+
+    def abort(self):
+        if os.path.exists(self.temp_path):
+            os.remove(self.temp_path)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self.close()
+            os.replace(self.temp_path, self.path)
+        else:
+            self.abort()
+
+
+class PNGBandWriter(AtomicBandWriter):
+    def __init__(self, path, width, height, mode, compress_level=6):
+        super().__init__(path)
+        color_type = {v: k for k, v in PNG_COLOR_TYPES.items()}[mode]
+        self.file = open(self.temp_path, "wb")
+        self.file.write(PNG_SIGNATURE)
+        self._write_chunk(b"IHDR", struct.pack(">IIBBBBB", width, height, 8, color_type, 0, 0, 0))
+        self.compressor = zlib.compressobj(compress_level)
+        self.pending = bytearray()
+        self.previous = np.zeros(width * len(mode), dtype=np.uint8)
+
+    def _write_chunk(self, chunk_type, data):
+        self.file.write(struct.pack(">I", len(data)) + chunk_type + data)
+        self.file.write(struct.pack(">I", zlib.crc32(chunk_type + data)))
+
+    def _flush_idat(self, final=False):
+        while len(self.pending) >= IDAT_SIZE or (final and self.pending):
+            self._write_chunk(b"IDAT", bytes(self.pending[:IDAT_SIZE]))
+            del self.pending[:IDAT_SIZE]
+
+    def write(self, band):
+        # Every row uses the Up filter, which vectorises over the whole band
+        rows = band.reshape(len(band), -1)
+        above = np.vstack([self.previous[None], rows[:-1]])
+        filtered = np.empty((len(rows), rows.shape[1] + 1), dtype=np.uint8)
+        filtered[:, 0] = 2
+        filtered[:, 1:] = rows - above
+        self.previous = rows[-1].copy()
+
+        self.pending += self.compressor.compress(filtered.tobytes())
+        self._flush_idat()
+
+    def close(self):
+        self.pending += self.compressor.flush()
+        self._flush_idat(final=True)
+        self._write_chunk(b"IEND", b"")
+        self.file.close()
+
+    def abort(self):
+        self.file.close()
+        super().abort()
+
+
+class PPMBandWriter(AtomicBandWriter):
+    def __init__(self, path, width, height, mode):
+        super().__init__(path)
+        if mode != "RGB":
+            raise ValueError("PPM output only supports RGB")
+
+        header = f"P6\n{width} {height}\n255\n".encode()
+        with open(self.temp_path, "wb") as f:
+            f.write(header)
+            f.truncate(len(header) + width * height * 3)
+        self.pixels = np.memmap(self.temp_path, dtype=np.uint8, mode="r+",
+                                offset=len(header), shape=(height, width, 3))
+        self.row = 0
+
+    def write(self, band):
+        self.pixels[self.row:self.row + len(band)] = band
+        self.row += len(band)
+
+    def close(self):
+        self.pixels.flush()
+        self.pixels = None
+
+    def abort(self):
+        self.pixels = None
+        super().abort()
+
+
+def open_reader(path):
+    with open(path, "rb") as f:
+        magic = f.read(8)
+    if magic == PNG_SIGNATURE:
+        return PNGBandReader(path)
+    if magic[:2] == b"P6":
+        return PPMBandReader(path)
+    raise ValueError("Streaming supports PNG and PPM files only")
+
+
+def can_stream(path):
+    # True when open_reader() can process the file in row bands
+    try:
+        with open_reader(path):
+            return True
+    except (OSError, ValueError):
+        return False
+
+
+def open_writer(path, width, height, mode, compress_level=stego.DEFAULT_COMPRESS_LEVEL):
+    if path.lower().endswith((".ppm", ".pnm")):
+        return PPMBandWriter(path, width, height, mode)
+    return PNGBandWriter(path, width, height, mode, compress_level)
+
+
+def stream_encode(src_path, dst_path, message, band_rows=256, bits_per_channel=1, use_alpha=False,
+                  flags=0, compress_level=stego.DEFAULT_COMPRESS_LEVEL):
+    stream_encode_chunks(src_path, dst_path, [bytes(message)], len(message), band_rows,
+                         bits_per_channel, use_alpha, flags, compress_level)
+
+
+def stream_encode_chunks(src_path, dst_path, chunks, body_size, band_rows=256, bits_per_channel=1,
+                         use_alpha=False, flags=0, compress_level=stego.DEFAULT_COMPRESS_LEVEL):
+    with open_reader(src_path) as reader:
+        if use_alpha and reader.channels != 4:
+            raise ValueError("Alpha embedding needs an RGBA image")
+        layout = stego.Layout(reader.width, reader.height, bits_per_channel, use_alpha, flags,
+                              body_size)
+        if not layout.header_fits():
+            raise ValueError("Image is too small to hold the header")
+        if body_size > layout.body_capacity():
+            raise ValueError("Message too large for image")
+
+        body = stego.BitFeeder(chunks)
+        header_bits = layout.header_bits()
+        first_pixel = 0
+        with open_writer(dst_path, reader.width, reader.height, reader.mode,
+                         compress_level) as writer:
+            for band in reader.bands(band_rows):
+                layout.embed(band, first_pixel, body, header_bits)
+                first_pixel += band.shape[0] * band.shape[1]
+                writer.write(band)
+
+
+def stream_open_body(src_path, band_rows=256):
+    # Returns (layout, chunks): the decoded layout and a generator of packed
+    # body bytes that keeps the file open until it is exhausted or closed.
+    # Bands of a multiple of 8 rows keep every band byte-aligned.
+    band_rows = -(-band_rows // 8) * 8
+    reader = open_reader(src_path)
+    try:
+        # Very narrow images need several bands to cover the header
+        bands, first, buffered = reader.bands(band_rows), [], 0
+        while buffered < stego.HEADER_PIXELS[stego.HEADER_VERSION]:
+            band = next(bands, None)
+            if band is None:
+                break
+            first.append(band)
+            buffered += band.shape[0] * band.shape[1]
+        if not first:
+            raise ValueError("No hidden message found")
+        layout = stego.layout_from_lsb(stego.lsb_bytes(np.concatenate(first)),
+                                       reader.width, reader.height)
+    except Exception:
+        reader.close()
+        raise
+
+    def chunks():
+        try:
+            first_pixel, end = 0, layout.end_pixel()
+            for band in itertools.chain(first, bands):
+                yield layout.body_bytes(band, first_pixel)
+                first_pixel += band.shape[0] * band.shape[1]
+                # Rows past a body of known length are never decoded
+                if first_pixel >= end:
+                    break
+        finally:
+            reader.close()
+
+    return layout, chunks()
+
+
+def inspect_file(path):
+    # (layout, payload length) for an image file carrying a payload, else
+    # None. PNG/PPM files are read in bands and others decoded; only the
+    # header rows are read unless the payload is a legacy one.
+    if can_stream(path):
+        layout, chunks = stream_open_body(path)
+        length = stego.find_payload(layout, chunks)
+    else:
+        with Image.open(path) as image:
+            # Encoded images are always saved as RGB or RGBA
+            if image.mode not in ("RGB", "RGBA"):
+                return None
+            layout = stego.read_layout(image)
+            length = stego.find_payload(layout, stego.iter_lsb_bytes(image, layout))
+    return None if length is None else (layout, length)
+
+
+def stream_decode_message(src_path, band_rows=256):
+    layout, chunks = stream_open_body(src_path, band_rows)
+    try:
+        return stego.read_payload(chunks, layout), layout
+    finally:
+        chunks.close()
+
+
+def stream_decode(src_path, band_rows=256):
+    return stream_decode_message(src_path, band_rows)[0]
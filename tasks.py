@@ -0,0 +1,60 @@
+# tasks.py
+import queue
+import threading
+
+POLL_INTERVAL_MS = 50
+
+
+class OperationCancelled(Exception):
+    pass
+
+
+class BackgroundTask:
+    # Runs job(progress) on a worker thread. Tk is only touched from the main
+    # thread: the worker posts events to a queue that is drained via root.after
+    def __init__(self, root, job, on_done, on_error, on_progress=None):
+        self.root = root
+        self.on_done = on_done
+        self.on_error = on_error
+        self.on_progress = on_progress
+        self.cancelled = threading.Event()
+        self.events = queue.Queue()
+
+        self.thread = threading.Thread(target=self._run, args=(job,), daemon=True)
+        self.thread.start()
+        self.root.after(POLL_INTERVAL_MS, self._poll)
+
+    def cancel(self):
+        self.cancelled.set()
+
+    def progress(self, done, total):
+        # Called from the worker; raising here unwinds the job at a safe point
+        if self.cancelled.is_set():
+            raise OperationCancelled("Operation cancelled")
+        self.events.put(("progress", (done, total)))
+
+    def _run(self, job):
+        try:
+            result = job(self.progress)
+            if self.cancelled.is_set():
+                raise OperationCancelled("Operation cancelled")
+            self.events.put(("done", result))
+        except Exception as e:
+            self.events.put(("error", e))
+
+    def _poll(self):
+        try:
+            while True:
+                kind, value = self.events.get_nowait()
+                if kind == "progress":
+                    if self.on_progress:
+                        self.on_progress(*value)
+                elif kind == "done":
+                    self.on_done(value)
+                    return
+                else:
+                    self.on_error(value)
+                    return
+        except queue.Empty:
+            pass
+        self.root.after(POLL_INTERVAL_MS, self._poll)
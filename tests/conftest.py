@@ -0,0 +1,22 @@
+# conftest.py
+import os
+import sys
+
+import numpy as np
+import pytest
+from cryptography.fernet import Fernet
+from PIL import Image
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+def write_cover(path, width=64, height=48, mode="RGB", seed=0):
+    channels = len(mode)
+    pixels = np.random.default_rng(seed).integers(0, 256, (height, width, channels), dtype=np.uint8)
+    Image.fromarray(pixels, mode).save(path)
+    return path
+
+
+@pytest.fixture
+def key():
+    return Fernet.generate_key().decode()
@@ -0,0 +1,54 @@
+# test_cli.py
+import json
+import os
+
+import cli
+from conftest import write_cover
+
+
+def test_embed_and_extract_cover_in_current_directory(tmp_path, monkeypatch, key):
+    monkeypatch.chdir(tmp_path)
+    write_cover("c.png")
+
+    assert cli.main(["embed", "c.png", "--out-dir", "o", "--key", key,
+                     "--message", "hello", "--workers", "1", "--quiet"]) == 0
+    assert os.path.exists(os.path.join("o", "c_encrypted.png"))
+
+    assert cli.main(["extract", os.path.join("o", "c_encrypted.png"), "--out-dir", "x",
+                     "--key", key, "--workers", "1", "--quiet"]) == 0
+    with open(os.path.join("x", "c_encrypted.txt"), encoding="utf-8") as f:
+        assert f.read() == "hello"
+
+
+def test_output_path_mirrors_directory_tree(tmp_path):
+    inputs = tmp_path / "in"
+    (inputs / "sub").mkdir(parents=True)
+    write_cover(str(inputs / "sub" / "a.png"))
+
+    [(path, base)] = cli.expand_inputs([str(inputs)])
+    output = cli.output_path(path, base, str(tmp_path / "out"), "_x", ".png")
+    assert output == os.path.normpath(str(tmp_path / "out" / "sub" / "a_x.png"))
+
+
+def test_results_record_generated_key(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    write_cover("c.png")
+    assert cli.main(["embed", "c.png", "--out-dir", "o", "--message", "hi",
+                     "--results", "r.jsonl", "--workers", "1", "--quiet"]) == 0
+    with open("r.jsonl", encoding="utf-8") as f:
+        [record] = [json.loads(line) for line in f]
+    assert record["status"] == "ok" and record["key"]
+
+
+def test_results_file_leaves_out_decrypted_messages(tmp_path, monkeypatch, capsys, key):
+    monkeypatch.chdir(tmp_path)
+    write_cover("c.png")
+    cli.main(["embed", "c.png", "--out-dir", "o", "--key", key, "--message", "secret",
+              "--workers", "1", "--quiet"])
+    assert cli.main(["extract", "o", "--key", key, "--results", "r.jsonl",
+                     "--workers", "1", "--quiet"]) == 0
+
+    assert "secret" in capsys.readouterr().out
+    with open("r.jsonl", encoding="utf-8") as f:
+        [record] = [json.loads(line) for line in f]
+    assert record["status"] == "ok" and "message" not in record
@@ -0,0 +1,184 @@
+# test_mailer.py
+import json
+import os
+import smtplib
+import socketserver
+import threading
+
+import pytest
+
+import mailer
+
+
+class FakeSMTP:
+    # Raises the queued errors one send at a time, then accepts
+    def __init__(self, errors):
+        self.errors = list(errors)
+        self.sent = []
+
+    def send_message(self, message):
+        if self.errors:
+            raise self.errors.pop(0)
+        self.sent.append(message)
+
+    def quit(self):
+        pass
+
+
+@pytest.fixture
+def sender(tmp_path, monkeypatch):
+    sender = mailer.KeySender(outbox_dir=str(tmp_path / "outbox"), host="localhost", port=25,
+                              sender_email="app@example.com", password="")
+    # Retries happen without sleeping through the backoff
+    monkeypatch.setattr(sender.stopping, "wait", lambda timeout=None: False)
+    return sender
+
+
+def deliver(sender, errors):
+    smtp = FakeSMTP(errors)
+    sender._connect = lambda: smtp
+    sender._disconnect = lambda: None
+    delivery = mailer.Delivery(sender.outbox.add("user@example.com", "key", "OTP123"))
+    sender._deliver(delivery)
+    return delivery, smtp
+
+
+def refused(code):
+    return smtplib.SMTPRecipientsRefused({"user@example.com": (code, b"refused")})
+
+
+@pytest.mark.parametrize("error, permanent", [
+    (refused(450), False),
+    (refused(550), True),
+    (smtplib.SMTPSenderRefused(451, b"rate limited", "app@example.com"), False),
+    (smtplib.SMTPSenderRefused(553, b"not allowed", "app@example.com"), True),
+    (smtplib.SMTPDataError(554, b"rejected"), True),
+    (smtplib.SMTPAuthenticationError(535, b"bad login"), False),
+    (smtplib.SMTPServerDisconnected("gone"), False),
+])
+def test_is_permanent(error, permanent):
+    assert mailer.is_permanent(error) == permanent
+
+
+def test_greylisted_recipient_is_retried(sender):
+    delivery, smtp = deliver(sender, [refused(450), refused(451)])
+    assert delivery.status == mailer.SENT
+    assert delivery.record["attempts"] == 3
+    assert len(smtp.sent) == 1
+
+
+def test_rejected_recipient_fails_without_retry(sender):
+    delivery, smtp = deliver(sender, [refused(550)])
+    assert delivery.status == mailer.FAILED
+    assert delivery.record["attempts"] == 1
+    assert os.listdir(os.path.join(sender.outbox.directory, "failed"))
+    assert not os.listdir(os.path.join(sender.outbox.directory, "pending"))
+
+
+def test_outbox_records_drop_the_key(sender):
+    delivery, _ = deliver(sender, [])
+    [name] = os.listdir(os.path.join(sender.outbox.directory, "sent"))
+    with open(os.path.join(sender.outbox.directory, "sent", name), encoding="utf-8") as f:
+        record = json.load(f)
+    assert record["status"] == mailer.SENT
+    assert "key" not in record and "otp" not in record
+
+
+class SMTPHandler(socketserver.StreamRequestHandler):
+    # Just enough SMTP for smtplib: replies come from server.replies for
+    # RCPT, and server.drop_after closes the session after that many messages
+    def handle(self):
+        server = self.server
+        server.connections += 1
+        self.reply("220 localhost ready")
+        delivered = 0
+        while line := self.rfile.readline():
+            command = line.decode().strip().upper()
+            if command.startswith(("EHLO", "HELO")):
+                self.reply("250 localhost")
+            elif command.startswith("MAIL"):
+                self.reply("250 OK")
+            elif command.startswith("RCPT"):
+                self.reply(server.replies.pop(0) if server.replies else "250 OK")
+            elif command.startswith("RSET"):
+                self.reply("250 OK")
+            elif command == "DATA":
+                self.reply("354 Go ahead")
+                data = b""
+                while (line := self.rfile.readline()) != b".\r\n":
+                    data += line
+                server.messages.append(data)
+                self.reply("250 Queued")
+                delivered += 1
+                if delivered == server.drop_after:
+                    return
+            elif command == "QUIT":
+                self.reply("221 Bye")
+                return
+            else:
+                self.reply("502 Not implemented")
+
+    def reply(self, text):
+        self.wfile.write(text.encode() + b"\r\n")
+
+
+@pytest.fixture
+def smtp_server():
+    server = socketserver.ThreadingTCPServer(("127.0.0.1", 0), SMTPHandler)
+    server.daemon_threads = True
+    server.connections, server.messages, server.replies, server.drop_after = 0, [], [], None
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+def local_sender(tmp_path, smtp_server):
+    return mailer.KeySender(outbox_dir=str(tmp_path / "smtp-outbox"), host="127.0.0.1",
+                            port=smtp_server.server_address[1], sender_email="app@example.com",
+                            password="", use_tls=False, timeout=5).start()
+
+
+def test_deliveries_share_one_smtp_session(tmp_path, smtp_server):
+    sender = local_sender(tmp_path, smtp_server)
+    try:
+        deliveries = [sender.enqueue(f"user{i}@example.com", f"key{i}", "OTP") for i in range(3)]
+        assert [delivery.wait(10) for delivery in deliveries] == [mailer.SENT] * 3
+    finally:
+        sender.stop(5)
+    assert smtp_server.connections == 1
+    assert b"key2" in smtp_server.messages[2]
+
+
+def test_dropped_session_is_reopened(tmp_path, smtp_server):
+    smtp_server.drop_after = 1
+    sender = local_sender(tmp_path, smtp_server)
+    try:
+        deliveries = [sender.enqueue(f"user{i}@example.com", "key", "OTP") for i in range(2)]
+        assert [delivery.wait(10) for delivery in deliveries] == [mailer.SENT] * 2
+    finally:
+        sender.stop(5)
+    assert smtp_server.connections == 2
+    assert deliveries[1].record["attempts"] == 2
+
+
+def test_greylisting_backs_off_and_retries(tmp_path, smtp_server):
+    smtp_server.replies = ["450 Greylisted, try again later"]
+    sender = local_sender(tmp_path, smtp_server)
+    try:
+        delivery = sender.enqueue("user@example.com", "key", "OTP")
+        assert delivery.wait(10) == mailer.SENT
+    finally:
+        sender.stop(5)
+    assert delivery.record["attempts"] == 2
+    assert len(smtp_server.messages) == 1
+
+
+def test_completing_a_record_twice_is_harmless(tmp_path):
+    # A second sender sharing the outbox may finish the same pending record
+    outbox = mailer.Outbox(str(tmp_path / "shared"))
+    record = outbox.add("user@example.com", "key", "OTP")
+    outbox.complete(dict(record), mailer.SENT)
+    outbox.complete(dict(record), mailer.SENT)
+    assert outbox.pending() == []
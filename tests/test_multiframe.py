@@ -0,0 +1,93 @@
+# test_multiframe.py
+import numpy as np
+import pytest
+from PIL import Image
+
+import cli
+import multiframe
+
+
+def write_animation(path, format, frames=4, size=(24, 16), mode="RGB"):
+    rng = np.random.default_rng(7)
+    images = [Image.fromarray(rng.integers(0, 256, (size[1], size[0], len(mode)), dtype=np.uint8), mode)
+              for _ in range(frames)]
+    if format == "GIF":
+        images = [image.convert("P") for image in images]
+    images[0].save(path, format=format, save_all=True, append_images=images[1:],
+                   duration=[40 + 10 * i for i in range(frames)], loop=0,
+                   **({"lossless": True} if format == "WEBP" else {}))
+    return path
+
+
+@pytest.mark.parametrize("format, extension", [("PNG", ".png"), ("GIF", ".gif"),
+                                               ("WEBP", ".webp"), ("TIFF", ".tiff")])
+def test_frame_round_trip(tmp_path, format, extension):
+    src = write_animation(str(tmp_path / f"cover{extension}"), format)
+    dst = str(tmp_path / f"out{multiframe.output_extension(src)}")
+    # Bigger than one frame can hold, so the body runs into later frames
+    message = bytes(range(256)) * 2
+    multiframe.frame_encode(src, dst, message)
+
+    assert multiframe.is_multiframe(dst)
+    decoded, layout = multiframe.frame_decode_message(dst)
+    assert decoded == message and layout.frames
+
+    with Image.open(src) as before, Image.open(dst) as after:
+        assert after.n_frames == before.n_frames
+        for index, ((original, _), (encoded, _)) in enumerate(
+                zip(multiframe.read_frames(before), multiframe.read_frames(after))):
+            assert np.all((original ^ encoded) <= 1), index
+
+
+def test_apng_keeps_frame_durations(tmp_path):
+    src = write_animation(str(tmp_path / "cover.gif"), "GIF")
+    dst = str(tmp_path / "out.png")
+    multiframe.frame_encode(src, dst, b"timed")
+    with Image.open(src) as before, Image.open(dst) as after:
+        assert [d for _, d in multiframe.read_frames(after)] == \
+               [d for _, d in multiframe.read_frames(before)]
+
+
+def test_message_too_large_for_all_frames(tmp_path):
+    src = write_animation(str(tmp_path / "cover.png"), "PNG", frames=2, size=(8, 8))
+    with pytest.raises(ValueError, match="too large"):
+        multiframe.frame_encode(src, str(tmp_path / "out.png"), b"x" * 100)
+
+
+def test_first_frame_must_hold_the_header(tmp_path):
+    src = write_animation(str(tmp_path / "cover.png"), "PNG", size=(4, 4))
+    with pytest.raises(ValueError, match="header"):
+        multiframe.frame_encode(src, str(tmp_path / "out.png"), b"x")
+
+
+def test_cli_needs_frames_flag_for_frame_payloads(tmp_path, key):
+    src = write_animation(str(tmp_path / "cover.gif"), "GIF")
+    output = str(tmp_path / "out.png")
+    assert cli.embed_file(src, output, b"x" * 200, key, frames=True)["status"] == "ok"
+
+    plain = cli.extract_file(output, None, key)
+    assert plain["status"] == "error" and "--frames" in plain["error"]
+    assert cli.extract_file(output, None, key, frames=True)["message"] == "x" * 200
+
+
+def test_single_frame_images_are_not_multiframe(tmp_path):
+    path = str(tmp_path / "still.png")
+    Image.new("RGB", (8, 8)).save(path)
+    assert not multiframe.is_multiframe(path)
+    assert not multiframe.is_multiframe(str(tmp_path / "missing.png"))
+
+
+def test_cli_expands_animated_directories(tmp_path, key):
+    covers = tmp_path / "covers"
+    covers.mkdir()
+    write_animation(str(covers / "x.gif"), "GIF")
+    write_animation(str(covers / "t.tiff"), "TIFF")
+    write_animation(str(covers / "w.webp"), "WEBP")
+    out_dir = tmp_path / "out"
+
+    assert cli.main(["embed", str(covers), "--frames", "--out-dir", str(out_dir), "--key", key,
+                     "--message", "x" * 200, "--workers", "1", "--quiet"]) == 0
+    outputs = sorted(path.name for path in out_dir.iterdir())
+    assert outputs == ["t_encrypted.tiff", "w_encrypted.png", "x_encrypted.png"]
+    for name in outputs:
+        assert cli.extract_file(str(out_dir / name), None, key, frames=True)["message"] == "x" * 200
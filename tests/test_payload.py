@@ -0,0 +1,76 @@
+# test_payload.py
+import base64
+import io
+import os
+import struct
+
+import pytest
+from cryptography.exceptions import InvalidTag
+from cryptography.fernet import Fernet
+from cryptography.hazmat.primitives.ciphers.aead import AESGCM
+
+import payload
+import stego
+
+
+def encrypt(key, data, chunk_size=1000):
+    return list(payload.encrypt_chunks(key, io.BytesIO(data), chunk_size))
+
+
+def decrypt(key, chunks):
+    return b"".join(payload.decrypt_chunks(key, stego.BodyReader(chunks).read))
+
+
+@pytest.mark.parametrize("size", [0, 1, 999, 1000, 1001, 5500])
+def test_chunked_round_trip(key, size):
+    data = os.urandom(size)
+    chunks = encrypt(key, data)
+    assert sum(map(len, chunks)) == payload.chunked_size(size, 1000)
+    assert decrypt(key, chunks) == data
+
+
+def test_truncated_stream_fails(key):
+    chunks = encrypt(key, os.urandom(3500))
+    # Dropping the final chunk leaves a stream that never ends
+    with pytest.raises(ValueError, match="truncated"):
+        decrypt(key, chunks[:-1])
+    # Cutting into a chunk breaks its tag
+    stream = b"".join(chunks)
+    with pytest.raises((InvalidTag, ValueError)):
+        decrypt(key, [stream[:-5]])
+
+
+def test_reordered_chunks_fail(key):
+    prefix, *body = encrypt(key, os.urandom(3500))
+    body[0], body[1] = body[1], body[0]
+    with pytest.raises(InvalidTag):
+        decrypt(key, [prefix] + body)
+
+
+def test_final_flag_is_authenticated(key):
+    prefix, first, *rest = encrypt(key, os.urandom(3500))
+    # Marking an early chunk as the last one would silently truncate the file
+    length = struct.unpack(">I", first[:4])[0] | payload.FINAL_CHUNK
+    with pytest.raises(InvalidTag):
+        decrypt(key, [prefix, struct.pack(">I", length) + first[4:]])
+
+
+def test_wrong_key_fails(key):
+    chunks = encrypt(key, b"secret file")
+    with pytest.raises(InvalidTag):
+        decrypt(Fernet.generate_key(), chunks)
+
+
+def test_gcm_key_is_not_the_fernet_key(key):
+    prefix, first = encrypt(key, b"secret file")
+    raw = AESGCM(base64.urlsafe_b64decode(key))
+    with pytest.raises(InvalidTag):
+        raw.decrypt(prefix + struct.pack(">I", 0), first[4:], first[:4])
+
+
+def test_seal_round_trip_with_compression(key):
+    message = b"compressible " * 100
+    flags, token = payload.seal(message, key, "zlib")
+    assert flags == payload.CODECS["zlib"]
+    assert payload.unseal(token, key, flags) == message
+    assert payload.seal(os.urandom(64), key, "zlib")[0] == 0
@@ -0,0 +1,71 @@
+# test_preview_cache.py
+import os
+
+from PIL import Image
+
+import preview_cache
+from conftest import write_cover
+
+
+def thumbnail_bytes(path):
+    # What one cached entry of this cover costs
+    with Image.open(path) as image:
+        width, height = preview_cache.preview_size(*image.size)
+    return 2 * width * height * 3
+
+
+def test_lru_evicts_by_bytes(tmp_path):
+    paths = [write_cover(str(tmp_path / f"c{i}.png"), 900, 600, seed=i) for i in range(3)]
+    cache = preview_cache.PreviewCache(max_bytes=2 * thumbnail_bytes(paths[0]))
+
+    cache.get(paths[0])
+    cache.get(paths[1])
+    cache.get(paths[0])
+    cache.get(paths[2])
+    assert [key[0] for key in cache.entries] == [os.path.abspath(p) for p in (paths[0], paths[2])]
+    assert cache.nbytes <= cache.max_bytes
+    assert (cache.hits, cache.misses) == (1, 3)
+
+
+def test_changed_file_is_loaded_again(tmp_path):
+    path = write_cover(str(tmp_path / "c.png"), 120, 80)
+    cache = preview_cache.PreviewCache()
+    first = cache.get(path)
+
+    Image.new("RGB", (80, 120), "red").save(path)
+    stat = os.stat(path)
+    os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1_000_000_000))
+    second = cache.get(path)
+    assert cache.misses == 2
+    assert second.size != first.size and second.getpixel((0, 0)) == (255, 0, 0)
+
+
+def test_render_runs_once_per_entry(tmp_path):
+    path = write_cover(str(tmp_path / "c.png"))
+    cache = preview_cache.PreviewCache()
+    calls = []
+    render = lambda thumbnail: calls.append(thumbnail) or len(calls)
+    assert cache.get(path, render) == cache.get(path, render) == 1
+
+
+def test_disk_tier_survives_a_restart(tmp_path, monkeypatch):
+    path = write_cover(str(tmp_path / "c.png"), 300, 200)
+    disk_dir = str(tmp_path / "thumbs")
+    first = preview_cache.PreviewCache(disk_dir=disk_dir).get(path)
+
+    # A new cache (the next run) must not decode the cover again
+    def decode(*args):
+        raise AssertionError("cover decoded again")
+    monkeypatch.setattr(preview_cache, "load_thumbnail", decode)
+    restarted = preview_cache.PreviewCache(disk_dir=disk_dir)
+    assert restarted.get(path).tobytes() == first.tobytes()
+    assert restarted.misses == 1
+
+
+def test_put_seeds_the_cache(tmp_path, monkeypatch):
+    path = write_cover(str(tmp_path / "c.png"))
+    cache = preview_cache.PreviewCache()
+    with Image.open(path) as image:
+        cache.put(path, image)
+    monkeypatch.setattr(preview_cache, "load_thumbnail", None)
+    assert cache.get(path).size == preview_cache.preview_size(64, 48)
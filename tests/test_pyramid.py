@@ -0,0 +1,96 @@
+# test_pyramid.py
+import os
+import subprocess
+import sys
+
+import pytest
+from PIL import Image
+
+import cli
+import pyramid
+from conftest import write_cover
+
+
+def test_importing_pyramid_leaves_numpy_unloaded():
+    code = "import sys, pyramid; print('numpy' in sys.modules, 'stego' in sys.modules)"
+    output = subprocess.run([sys.executable, "-c", code], capture_output=True, text=True, check=True,
+                            cwd=os.path.dirname(os.path.abspath(pyramid.__file__))).stdout
+    assert output.split() == ["False", "False"]
+
+
+def test_viewport_zoom_keeps_point_under_cursor():
+    viewport = pyramid.Viewport(4000, 3000, 400, 300)
+    assert viewport.fitted and viewport.zoom == pytest.approx(0.1)
+
+    before = (viewport.x + 100 / viewport.zoom, viewport.y + 50 / viewport.zoom)
+    viewport.zoom_at(4, 100, 50)
+    assert (viewport.x + 100 / viewport.zoom, viewport.y + 50 / viewport.zoom) == pytest.approx(before)
+    assert not viewport.fitted
+
+    viewport.zoom_at(1e6, 0, 0)
+    assert viewport.zoom == pyramid.MAX_ZOOM
+    viewport.pan(1e9, 1e9)
+    assert (viewport.x, viewport.y) == (0, 0)
+
+
+@pytest.mark.parametrize("zoom, pan", [(1, (0, 0)), (3.7, (-333, -121)), (0.4, (0, 0))])
+def test_tiles_cover_the_view_without_gaps(zoom, pan):
+    image = Image.new("RGB", (1500, 1100))
+    levels = pyramid.ImagePyramid("unused.png", image)
+    viewport = pyramid.Viewport(*image.size, 640, 480)
+    viewport.zoom_at(zoom / viewport.zoom, 0, 0)
+    viewport.pan(*pan)
+
+    number, level = levels.best_level(viewport.zoom)
+    covered = set()
+    for tile in levels.tiles(viewport, number, level):
+        x, y = tile.position
+        cells = {(cx, cy) for cx in range(x, x + tile.size[0]) for cy in range(y, y + tile.size[1])}
+        assert not covered & cells
+        covered |= cells
+    width = min(640, round(image.width * viewport.zoom))
+    height = min(480, round(image.height * viewport.zoom))
+    left, top = max(0, -round(viewport.x * viewport.zoom)), max(0, -round(viewport.y * viewport.zoom))
+    view = {(x, y) for x in range(left, left + width) for y in range(top, top + height)}
+    assert view <= covered
+
+
+def test_tile_cache_evicts_least_recently_used():
+    cache = pyramid.TileCache(max_bytes=3 * 10 * 10 * 4)
+    tile = lambda: Image.new("RGB", (10, 10))
+    for key in "abc":
+        cache.get(key, tile, lambda image: key)
+    cache.get("a", tile, lambda image: "a")
+    cache.get("d", tile, lambda image: "d")
+    assert list(cache.entries) == ["c", "a", "d"]
+    assert (cache.hits, cache.misses) == (1, 4)
+
+
+def test_region_rects_cover_pixel_range():
+    width = 10
+    for first, last in [(0, 32), (3, 7), (5, 25), (10, 20), (0, 0)]:
+        pixels = set()
+        for left, top, right, bottom in pyramid.region_rects(first, last, width):
+            pixels |= {y * width + x for x in range(left, right) for y in range(top, bottom)}
+        assert pixels == set(range(first, last))
+
+
+@pytest.mark.parametrize("format", ["PNG", "BMP"])
+def test_payload_region(tmp_path, key, format):
+    cover = write_cover(str(tmp_path / "cover.png"), 40, 30)
+    output = str(tmp_path / f"out.{format.lower()}")
+    result = cli.embed_file(cover, output, b"region", key, format=format)
+
+    region = pyramid.payload_region(output)
+    assert region.start == 32
+    assert region.end == region.start + -(-result["bytes"] * 8 // 3)
+    assert pyramid.payload_region(cover) is None
+
+
+def test_payload_region_leaves_cli_unloaded(tmp_path):
+    path = write_cover(str(tmp_path / "cover.png"))
+    code = ("import sys, pyramid; pyramid.payload_region(sys.argv[1]); "
+            "print(any(name in sys.modules for name in ('scanner', 'cli', 'cryptography')))")
+    output = subprocess.run([sys.executable, "-c", code, path], capture_output=True, text=True,
+                            check=True, cwd=os.path.dirname(os.path.abspath(pyramid.__file__))).stdout
+    assert output.strip() == "False"
@@ -0,0 +1,63 @@
+# test_scanner.py
+import gc
+import os
+import warnings
+
+import pytest
+from PIL import Image
+
+import cli
+import scanner
+from conftest import write_cover
+
+
+def embed(tmp_path, key, name, format="PNG"):
+    cover = write_cover(str(tmp_path / f"{name}-cover.png"))
+    output = str(tmp_path / "corpus" / f"{name}.{format.lower()}")
+    result = cli.embed_file(cover, output, b"hidden", key, format=format)
+    assert result["status"] == "ok"
+    return output, result["bytes"]
+
+
+@pytest.mark.parametrize("format", ["PNG", "BMP"])
+def test_inspect_image_finds_headed_payload(tmp_path, key, format):
+    path, size = embed(tmp_path, key, "carrier", format)
+    version, payload_size, flags = scanner.inspect_image(path)
+    assert version > 0 and payload_size == size
+
+
+def test_inspect_image_ignores_plain_images(tmp_path):
+    assert scanner.inspect_image(write_cover(str(tmp_path / "plain.png"))) is None
+    palette = str(tmp_path / "palette.gif")
+    Image.new("P", (16, 16)).save(palette)
+    assert scanner.inspect_image(palette) is None
+
+
+def test_inspect_image_closes_decoded_files(tmp_path, key):
+    path, _ = embed(tmp_path, key, "carrier", "BMP")
+    palette = str(tmp_path / "palette.gif")
+    Image.new("P", (16, 16)).save(palette)
+
+    with warnings.catch_warnings(record=True) as caught:
+        warnings.simplefilter("always", ResourceWarning)
+        scanner.inspect_image(path)
+        scanner.inspect_image(palette)
+        gc.collect()
+    assert not [w for w in caught if issubclass(w.category, ResourceWarning)]
+
+
+def test_scan_is_incremental(tmp_path, key):
+    carrier, _ = embed(tmp_path, key, "carrier")
+    plain = write_cover(str(tmp_path / "corpus" / "plain.png"))
+    corpus = str(tmp_path / "corpus")
+    index = scanner.ScanIndex(str(tmp_path / "index.sqlite"))
+    try:
+        assert scanner.scan(index, [corpus], workers=1) == (2, 0, 0)
+        assert [row["path"] for row in index.query()] == [os.path.abspath(carrier)]
+
+        assert scanner.scan(index, [corpus], workers=1) == (0, 2, 0)
+        os.remove(plain)
+        assert scanner.scan(index, [corpus], workers=1) == (0, 1, 1)
+        assert index.summary() == {"files": 1, "carriers": 1, "errors": 0}
+    finally:
+        index.close()
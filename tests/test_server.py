@@ -0,0 +1,88 @@
+# test_server.py
+import asyncio
+import json
+
+import pytest
+
+import server
+from conftest import write_cover
+
+
+async def request(port, method, path, body=b"", headers=None):
+    # Returns (status, headers, body) once the server closes the connection
+    reader, writer = await asyncio.open_connection("127.0.0.1", port)
+    lines = [f"{method} {path} HTTP/1.1", f"Content-Length: {len(body)}"]
+    lines += [f"{name}: {value}" for name, value in (headers or {}).items()]
+    writer.write(("\r\n".join(lines) + "\r\n\r\n").encode("latin-1") + body)
+    await writer.drain()
+    response = await asyncio.wait_for(reader.read(), 60)
+    writer.close()
+
+    head, _, body = response.partition(b"\r\n\r\n")
+    status_line, *header_lines = head.decode("latin-1").split("\r\n")
+    headers = dict(line.split(": ", 1) for line in header_lines)
+    return int(status_line.split()[1]), headers, body
+
+
+def run(test, **options):
+    async def main():
+        stego_server = await server.StegoServer(port=0, workers=1, **options).start()
+        try:
+            await test(stego_server)
+        finally:
+            await stego_server.close()
+    asyncio.run(main())
+
+
+def test_embed_then_extract_closes_each_connection(tmp_path, key):
+    with open(write_cover(str(tmp_path / "cover.png")), "rb") as f:
+        cover = f.read()
+
+    async def test(stego_server):
+        message = b"over http"
+        status, headers, image = await request(
+            stego_server.port, "POST", "/embed", message + cover,
+            {"X-Payload-Length": len(message), "X-Key": key})
+        assert status == 200 and headers["Content-Type"] == "image/png"
+
+        status, _, body = await request(stego_server.port, "POST", "/extract", image,
+                                        {"X-Key": key})
+        assert (status, body) == (200, message)
+
+    run(test)
+
+
+def test_unexpected_errors_answer_500(monkeypatch):
+    async def test(stego_server):
+        async def broken(writer):
+            raise RuntimeError("boom")
+        stego_server.health = broken
+
+        status, _, body = await request(stego_server.port, "GET", "/health")
+        assert status == 500
+        assert json.loads(body) == {"error": "Internal server error"}
+
+    run(test)
+
+
+@pytest.mark.parametrize("method, path, headers, status", [
+    ("GET", "/missing", {}, 404),
+    ("GET", "/embed", {}, 405),
+    ("POST", "/extract", {}, 400),
+    ("POST", "/embed", {"X-Payload-Length": "0"}, 400),
+])
+def test_bad_requests(method, path, headers, status):
+    async def test(stego_server):
+        assert (await request(stego_server.port, method, path, b"xx", headers))[0] == status
+
+    run(test)
+
+
+def test_busy_server_answers_503():
+    async def test(stego_server):
+        stego_server.in_flight = stego_server.max_in_flight
+        status, headers, _ = await request(stego_server.port, "POST", "/extract", b"x",
+                                           {"X-Key": "k"})
+        assert status == 503 and headers["Retry-After"] == "3"
+
+    run(test, retry_after=3)
@@ -0,0 +1,72 @@
+# test_shards.py
+import os
+
+import pytest
+
+import cli
+import shards
+from conftest import write_cover
+
+
+def make_album(tmp_path, key, count=3, message=None, payload_path=None, sizes=None):
+    covers, outputs = [], []
+    tmp_path.mkdir(exist_ok=True)
+    for i in range(count):
+        width, height = sizes[i] if sizes else (64, 48)
+        covers.append(write_cover(str(tmp_path / f"cover{i}.png"), width, height, seed=i))
+        outputs.append(str(tmp_path / "album" / f"shard{i}.png"))
+    album = shards.embed_album(covers, outputs, message, key, payload_path)
+    return album, outputs
+
+
+def test_message_round_trip_in_any_order(tmp_path, key):
+    message = os.urandom(600).hex().encode()
+    album, outputs = make_album(tmp_path, key, 3, message)
+    assert album["status"] == "ok" and album["shards"] == 3
+
+    result = shards.extract_album(outputs[::-1], key)
+    assert result["status"] == "ok", result.get("error")
+    assert result["message"].encode() == message
+    assert result["payload_id"] == album["payload_id"]
+
+
+def test_file_round_trip(tmp_path, key):
+    hidden = tmp_path / "hidden.bin"
+    hidden.write_bytes(os.urandom(3000))
+    album, outputs = make_album(tmp_path, key, 2, payload_path=str(hidden), sizes=[(120, 80), (60, 80)])
+    assert album["status"] == "ok"
+
+    result = shards.extract_album(outputs, key, str(tmp_path / "out"))
+    assert result["status"] == "ok", result.get("error")
+    with open(result["output"], "rb") as f:
+        assert f.read() == hidden.read_bytes()
+
+
+def test_plan_shards_is_proportional_and_exact():
+    assert shards.plan_shards([100, 300], 200) == [50, 150]
+    assert sum(shards.plan_shards([7, 11, 13], 30)) == 30
+    with pytest.raises(ValueError, match="covers hold"):
+        shards.plan_shards([10, 10], 21)
+
+
+def test_missing_duplicate_and_mixed_shards(tmp_path, key):
+    album, outputs = make_album(tmp_path, key, 3, b"x" * 1500)
+    other, other_outputs = make_album(tmp_path / "other", key, 2, b"y" * 100)
+
+    missing = shards.extract_album(outputs[:2], key)
+    assert missing["status"] == "error" and "Missing shards 3 of 3" in missing["error"]
+    duplicate = shards.extract_album(outputs + outputs[:1], key)
+    assert "Duplicate shards" in duplicate["error"]
+    mixed = shards.extract_album(outputs + other_outputs[:1], key)
+    assert "different payloads" in mixed["error"]
+
+
+def test_covers_too_small(tmp_path, key):
+    album, _ = make_album(tmp_path, key, 2, os.urandom(5000), sizes=[(16, 16), (16, 16)])
+    assert album["status"] == "error" and "covers hold" in album["error"]
+
+
+def test_single_shard_is_refused_by_plain_extract(tmp_path, key):
+    _, outputs = make_album(tmp_path, key, 2, b"z" * 200)
+    result = cli.extract_file(outputs[0], None, key)
+    assert result["status"] == "error" and "--shards" in result["error"]
@@ -0,0 +1,157 @@
+# test_stego.py
+import numpy as np
+import pytest
+from PIL import Image
+
+import stego
+
+
+def random_pixels(width, height, channels=3, seed=0):
+    return np.random.default_rng(seed).integers(0, 256, (height, width, channels), dtype=np.uint8)
+
+
+def legacy_encode(image, message):
+    # The per-pixel loop the GUI used before the header existed
+    width, height = image.size
+    pixels = image.load()
+    binary_message = ''.join(format(byte, '08b') for byte in message)
+    if len(binary_message) > width * height * 3:
+        raise ValueError("Message too large for image")
+    binary_message += '1111111111111110'
+
+    idx = 0
+    for row in range(height):
+        for col in range(width):
+            if idx < len(binary_message):
+                pixel = list(pixels[col, row])
+                for color_channel in range(3):
+                    if idx < len(binary_message):
+                        pixel[color_channel] = pixel[color_channel] & ~1 | int(binary_message[idx])
+                        idx += 1
+                pixels[col, row] = tuple(pixel)
+            else:
+                break
+
+
+@pytest.mark.parametrize("mode", ["RGB", "RGBA"])
+@pytest.mark.parametrize("width", [1, 7, 64])
+def test_legacy_images_still_decode(mode, width):
+    message = b"gAAAAABlegacy-token-" + bytes(range(48, 122))
+    image = Image.fromarray(random_pixels(width, 400 // width + 20, len(mode)), mode).copy()
+    legacy_encode(image, message)
+
+    assert stego.decode_lsb(image) == message
+    assert stego.decode_lsb(np.array(image)) == message
+    assert stego.probe(image) is None
+
+
+@pytest.mark.parametrize("mode", ["RGB", "RGBA"])
+@pytest.mark.parametrize("width", [1, 7, 64])
+def test_vectorised_embed_matches_legacy_loop(mode, width):
+    # Header-less layouts write exactly the bits the old loop wrote
+    message = b"gAAAAABbit-for-bit"
+    pixels = random_pixels(width, 200 // width + 10, len(mode), seed=width)
+    image = Image.fromarray(pixels, mode).copy()
+    legacy_encode(image, message)
+
+    layout = stego.Layout(width, pixels.shape[0], version=0)
+    layout.embed(pixels, 0, stego.BitFeeder([message + stego.TERMINATOR]))
+    assert np.array_equal(pixels, np.array(image))
+
+
+@pytest.mark.parametrize("bits", [1, 2, 3, 4])
+@pytest.mark.parametrize("use_alpha", [False, True])
+def test_capacity_plan_is_exact(bits, use_alpha):
+    width, height = 37, 23
+    cover = random_pixels(width, height, 4 if use_alpha else 3, seed=bits)
+    plan = stego.plan_capacity(cover, 0, bits, use_alpha)
+    payload = np.random.default_rng(bits).integers(0, 256, plan.max_payload, dtype=np.uint8).tobytes()
+
+    pixels = cover.copy()
+    stego.embed(pixels, payload, bits_per_channel=bits, use_alpha=use_alpha)
+    assert stego.extract(pixels) == payload
+    info = stego.probe(pixels)
+    assert (info.bits_per_channel, info.use_alpha, info.length) == (bits, use_alpha, len(payload))
+
+    # Only the low `bits` bits of the touched pixels changed
+    touched = stego.plan_capacity(cover, len(payload), bits, use_alpha).pixels_touched
+    changed = (pixels ^ cover).reshape(-1, cover.shape[2])
+    assert not changed[touched:].any()
+    assert not (changed[:stego.HEADER_PIXELS[stego.HEADER_VERSION]] & 0xFE).any()
+    assert not (changed >> bits).any()
+
+    with pytest.raises(ValueError, match="too large"):
+        stego.embed(cover.copy(), payload + b"x", bits_per_channel=bits, use_alpha=use_alpha)
+    assert not stego.plan_capacity(cover, len(payload) + 1, bits, use_alpha).fits
+
+
+def test_alpha_untouched_without_use_alpha():
+    cover = random_pixels(16, 16, 4)
+    pixels = cover.copy()
+    stego.embed(pixels, b"rgb only", bits_per_channel=2)
+    assert np.array_equal(pixels[..., 3], cover[..., 3])
+    assert stego.extract(pixels) == b"rgb only"
+
+
+@pytest.mark.parametrize("version", [0, 3, 0xFF])
+def test_magic_with_unknown_version_is_cover_data(version):
+    # One plain image in 65,536 starts with the magic by chance
+    pixels = random_pixels(16, 16)
+    data = stego.HEADER_MAGIC + bytes([version]) + bytes(range(9))
+    stego.embed_bits(pixels, np.unpackbits(np.frombuffer(data, dtype=np.uint8)))
+
+    assert stego.probe(pixels) is None
+    assert not stego.read_layout(pixels).header
+
+
+@pytest.mark.parametrize("size", [(2, 2), (1, 31), (5, 6)])
+def test_cover_too_small_for_header(size):
+    pixels = random_pixels(*size)
+    plan = stego.plan_capacity(pixels, 0)
+    assert not plan.fits and plan.max_payload == 0
+    with pytest.raises(ValueError, match="too small"):
+        stego.embed(pixels, b"")
+
+
+def test_smallest_cover_holds_empty_payload():
+    pixels = random_pixels(4, 8)
+    assert stego.plan_capacity(pixels, 0).fits
+    stego.embed(pixels, b"")
+    assert stego.extract(pixels) == b""
+
+
+def test_find_payload_detects_legacy_tokens():
+    message = stego.FERNET_PREFIX + b"BlegacyToken"
+    image = Image.fromarray(random_pixels(20, 20), "RGB").copy()
+    legacy_encode(image, message)
+    layout = stego.read_layout(image)
+    assert stego.find_payload(layout, stego.iter_lsb_bytes(image, layout)) == len(message)
+
+    plain = random_pixels(20, 20)
+    layout = stego.read_layout(plain)
+    assert stego.find_payload(layout, stego.iter_lsb_bytes(plain, layout)) is None
+
+
+@pytest.mark.parametrize("bits", [1, 3])
+@pytest.mark.parametrize("use_alpha", [False, True])
+@pytest.mark.parametrize("width", [1, 13, 96])
+@pytest.mark.parametrize("band_rows", [1, 9, 37])
+@pytest.mark.parametrize("kind", ["image", "strided"])
+def test_threaded_embed_matches_single_thread(bits, use_alpha, width, band_rows, kind):
+    height = 3000 // width + 40
+    message = bytes(np.random.default_rng(1).integers(0, 256, 300, dtype=np.uint8))
+
+    def cover():
+        if kind == "image":
+            return Image.fromarray(random_pixels(width, height, 4), "RGBA").copy()
+        # Every other row and column of a larger array: a non-contiguous view
+        return random_pixels(2 * width + 3, 2 * height + 1, 4)[1::2, 2::2]
+
+    single, threaded = cover(), cover()
+    stego.embed(single, message, bits_per_channel=bits, use_alpha=use_alpha)
+    stego.embed(threaded, message, bits_per_channel=bits, use_alpha=use_alpha, threads=4,
+                band_rows=band_rows)
+
+    assert np.array_equal(np.asarray(single), np.asarray(threaded))
+    assert stego.extract(threaded, threads=4, band_rows=band_rows) == message
+    assert stego.extract(threaded) == message
@@ -0,0 +1,130 @@
+# test_streaming.py
+import struct
+import zlib
+
+import numpy as np
+import pytest
+from PIL import Image
+
+import stego
+import streaming
+from conftest import write_cover
+
+
+def filter_row(filter_type, row, above, bpp):
+    out = bytearray([filter_type])
+    for i, value in enumerate(row):
+        left = row[i - bpp] if i >= bpp else 0
+        upper_left = above[i - bpp] if i >= bpp else 0
+        if filter_type == 0:
+            predictor = 0
+        elif filter_type == 1:
+            predictor = left
+        elif filter_type == 2:
+            predictor = above[i]
+        elif filter_type == 3:
+            predictor = (left + above[i]) >> 1
+        else:
+            p = left + above[i] - upper_left
+            pa, pb, pc = abs(p - left), abs(p - above[i]), abs(p - upper_left)
+            predictor = left if pa <= pb and pa <= pc else above[i] if pb <= pc else upper_left
+        out.append((value - predictor) & 0xFF)
+    return bytes(out)
+
+
+def write_filtered_png(path, pixels):
+    # Cycles through all five filter types row by row
+    height, width, channels = pixels.shape
+    rows = pixels.reshape(height, -1).tolist()
+    above, data = [0] * len(rows[0]), b""
+    for y, row in enumerate(rows):
+        data += filter_row(y % 5, row, above, channels)
+        above = row
+
+    def chunk(chunk_type, body):
+        return (struct.pack(">I", len(body)) + chunk_type + body
+                + struct.pack(">I", zlib.crc32(chunk_type + body)))
+
+    color_type = {3: 2, 4: 6}[channels]
+    with open(path, "wb") as f:
+        f.write(streaming.PNG_SIGNATURE)
+        f.write(chunk(b"IHDR", struct.pack(">IIBBBBB", width, height, 8, color_type, 0, 0, 0)))
+        f.write(chunk(b"IDAT", zlib.compress(data)))
+        f.write(chunk(b"IEND", b""))
+
+
+@pytest.mark.parametrize("mode", ["RGB", "RGBA"])
+@pytest.mark.parametrize("band_rows", [1, 3, 8])
+def test_bands_undo_every_filter_type(tmp_path, mode, band_rows):
+    pixels = np.random.default_rng(1).integers(0, 256, (13, 11, len(mode)), dtype=np.uint8)
+    path = str(tmp_path / "filtered.png")
+    write_filtered_png(path, pixels)
+
+    with streaming.open_reader(path) as reader:
+        bands = list(reader.bands(band_rows))
+    assert all(len(band) <= band_rows for band in bands)
+    assert np.array_equal(np.concatenate(bands), pixels)
+    assert np.array_equal(np.asarray(Image.open(path)), pixels)
+
+
+def test_stream_round_trip_matches_whole_image_decode(tmp_path):
+    src = write_cover(str(tmp_path / "cover.png"), 40, 30)
+    dst = str(tmp_path / "out.png")
+    streaming.stream_encode(src, dst, b"streamed message", band_rows=8)
+
+    assert streaming.stream_decode(dst) == b"streamed message"
+    with Image.open(dst) as image:
+        assert stego.decode_message(image)[0] == b"streamed message"
+
+
+def test_stream_message_too_large(tmp_path):
+    src = write_cover(str(tmp_path / "cover.png"), 8, 8)
+    with pytest.raises(ValueError, match="too large"):
+        streaming.stream_encode(src, str(tmp_path / "out.png"), b"x" * 1000)
+
+
+def test_can_stream_rejects_other_formats(tmp_path):
+    path = str(tmp_path / "cover.bmp")
+    Image.new("RGB", (8, 8)).save(path)
+    assert not streaming.can_stream(path)
+
+
+@pytest.mark.parametrize("width", [1, 2, 3])
+def test_stream_decode_narrow_image(tmp_path, width):
+    src = write_cover(str(tmp_path / "cover.png"), width, 400)
+    dst = str(tmp_path / "out.png")
+    streaming.stream_encode(src, dst, b"narrow", band_rows=8)
+    assert streaming.stream_decode(dst, band_rows=8) == b"narrow"
+
+
+class ReadSizes:
+    # File wrapper recording the size of every read
+    def __init__(self, file):
+        self.file = file
+        self.sizes = []
+
+    def read(self, size=-1):
+        data = self.file.read(size)
+        self.sizes.append(len(data))
+        return data
+
+    def __getattr__(self, name):
+        return getattr(self.file, name)
+
+
+def test_single_large_idat_is_read_in_pieces(tmp_path):
+    pixels = np.random.default_rng(2).integers(0, 256, (300, 400, 3), dtype=np.uint8)
+    path = str(tmp_path / "one-idat.png")
+    write_filtered_png(path, pixels)
+
+    with streaming.open_reader(path) as reader:
+        reader.file = ReadSizes(reader.file)
+        bands = list(reader.bands(16))
+    assert max(reader.file.sizes) <= streaming.IDAT_SIZE
+    assert np.array_equal(np.concatenate(bands), pixels)
+
+
+def test_stream_cover_too_small_for_header(tmp_path):
+    src = write_cover(str(tmp_path / "cover.png"), 2, 2)
+    with pytest.raises(ValueError, match="too small"):
+        streaming.stream_encode(src, str(tmp_path / "out.png"), b"")